@@ -10,19 +10,35 @@
 
 from __future__ import print_function
 from argparse import ArgumentParser
-from collections import namedtuple
-try:
-    reduce  # Python 2
-except NameError:
-    from functools import reduce  # Python 3
+from collections import defaultdict, namedtuple
+from functools import partial, total_ordering
+from heapq import heappush, heapreplace, nlargest
 from pathlib import Path
-from operator import attrgetter
+import fnmatch
 import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+try:
+    import pwd
+except ImportError:
+    pwd = None  # not available on Windows
+
+import gitindex
 
 
 FileInfo = namedtuple('FileInfo', ['path', 'size'])
 
 
+# The maximum number of directories waiting to be scanned that are shared
+# between the threads (each thread keeps any overflow to itself), and the
+# maximum number of scanned directories' results waiting to be collected.
+MAX_QUEUED_DIRECTORIES = 1000
+MAX_QUEUED_RESULTS = 100
+
+
 def parse_args():
     """Parse command line arguments."""
     parser = ArgumentParser(description='List the biggest files.')
@@ -42,46 +58,663 @@ def parse_args():
         '-p', '--pattern',
         dest='pattern',
         default='*',
-        help='a pattern to narrow down the search, e.g. "*.txt"\n'
+        help='a pattern to narrow down the search, e.g. "*.txt"; it is '
+             'matched against file names only, so it cannot contain path '
+             'separators\n'
              ' NOTE: The pattern might need to be escaped, possibly '
              'using quotes or backslashes, depending on your shell.')
 
-    return parser.parse_args()
+    parser.add_argument(
+        '-g', '--group-by',
+        dest='group_by',
+        choices=sorted(GROUP_KEYS),
+        action='append',
+        help='show the biggest files per group instead of overall; '
+             'can be given multiple times to answer several questions '
+             'with a single walk')
+
+    parser.add_argument(
+        '-j', '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of threads to scan directories concurrently with; '
+             'helps on high-latency (e.g. network) file systems '
+             '(default: 1)')
+
+    parser.add_argument(
+        '-i', '--index',
+        dest='index',
+        metavar='INDEX',
+        help='keep the sizes in an index file (created if not existing) '
+             'and only re-list directories that were modified since the '
+             'last run\n'
+             ' NOTE: Files that were changed in place (without their '
+             'directory being modified) keep the size recorded earlier.')
+
+    parser.add_argument(
+        '-t', '--tracked',
+        dest='tracked',
+        action='store_true',
+        help='only consider files tracked by Git, taking their paths and '
+             'sizes from the repository\'s index instead of walking the '
+             'file system\n'
+             ' NOTE: Sizes are as of the last time Git looked at the '
+             'files (e.g. on `git status`), and sizes of 4 GiB and beyond '
+             'are recorded modulo 4 GiB.  Files deleted without `git rm` '
+             'are still listed.')
+
+    parser.add_argument(
+        '-d', '--by-dir',
+        dest='by_dir',
+        action='store_true',
+        help='show the directories using the most disk space (including '
+             'their subdirectories, like `du`) instead of files; only '
+             'entries matching the pattern are counted')
+
+    parser.add_argument(
+        '--depth',
+        dest='depth',
+        type=int,
+        default=1,
+        help='how many levels beneath PATH the directories to show with '
+             '`--by-dir` are located (default: 1)')
+
+    args = parser.parse_args()
+
+    if any(sep in args.pattern for sep in (os.sep, os.altsep) if sep):
+        parser.error('--pattern is matched against file names and cannot '
+                     'contain path separators: ' + args.pattern)
+    if args.index and args.jobs > 1:
+        parser.error('--jobs cannot be combined with --index')
+    if args.tracked:
+        for option, given in [('--index', args.index),
+                              ('--jobs', args.jobs > 1)]:
+            if given:
+                parser.error(option + ' cannot be combined with --tracked')
+    if args.by_dir:
+        for option, given in [('--group-by', args.group_by),
+                              ('--index', args.index),
+                              ('--jobs', args.jobs > 1),
+                              ('--tracked', args.tracked)]:
+            if given:
+                parser.error(option + ' cannot be combined with --by-dir')
+
+    return args
 
 
 def collect_file_infos(search_path, pattern):
-    """Yield information on each file along the path."""
-    file_paths = collect_file_paths(search_path, pattern)
-    return map(create_file_info, file_paths)
+    """Yield information on each file along the path.
+
+    Directories are traversed depth-first, in the same order as
+    `os.walk` would, but each of them is listed only once.
+    """
+    match = compile_pattern(pattern)
+    directories = [search_path]
+    while directories:
+        file_infos, subdirectories = scan_directory(directories.pop(), match)
+        for file_info in file_infos:
+            yield file_info
+        directories.extend(reversed(subdirectories))
+
+
+def collect_file_infos_concurrently(search_path, pattern, jobs):
+    """Yield information on each file along the path, scanning up to
+    ``jobs`` directories at the same time.
+
+    The files are yielded in no particular order.
+    """
+    match = compile_pattern(pattern)
+    directories = queue.Queue()
+    results = queue.Queue(MAX_QUEUED_RESULTS)
+    stopped = threading.Event()
+    lock = threading.Lock()
+    unfinished = [1]  # Number of directories not yet completely scanned
+
+    def put(queue_, item):
+        """Put the item into the queue unless stopped in the meantime."""
+        while not stopped.is_set():
+            try:
+                queue_.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def work():
+        overflow = []
+        try:
+            while not stopped.is_set():
+                while overflow and \
+                        directories.qsize() < MAX_QUEUED_DIRECTORIES:
+                    directories.put(overflow.pop())
+
+                if overflow:
+                    directory = overflow.pop()
+                else:
+                    try:
+                        directory = directories.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+
+                file_infos, subdirectories = scan_directory(directory, match)
+
+                with lock:
+                    unfinished[0] += len(subdirectories)
+                for subdirectory in subdirectories:
+                    if directories.qsize() < MAX_QUEUED_DIRECTORIES:
+                        directories.put(subdirectory)
+                    else:
+                        overflow.append(subdirectory)
+
+                if file_infos:
+                    put(results, file_infos)
+
+                with lock:
+                    unfinished[0] -= 1
+                    finished = (unfinished[0] == 0)
+                if finished:
+                    put(results, None)
+        except BaseException as e:
+            put(results, e)
+
+    directories.put(search_path)
+    threads = [threading.Thread(target=work) for _ in range(jobs)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        while True:
+            file_infos = results.get()
+            if file_infos is None:
+                break
+            if isinstance(file_infos, BaseException):
+                raise file_infos
+            for file_info in file_infos:
+                yield file_info
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+
+
+def collect_tracked_file_infos(search_path, pattern):
+    """Yield information on each file along the path that is tracked in
+    the Git repository containing it, as recorded in the repository's
+    index.
+
+    Only files the index records as empty are looked at, as Git also
+    records files that way when it cannot be sure they did not change
+    right after it looked at them.  Those that vanished are skipped.
+
+    Other files are not looked at, so files that were deleted from the
+    working tree but not from the index are still listed with their
+    recorded sizes.  (This differs from ``linecounter.py --tracked``,
+    which has to open each file anyway and thus skips them.)
+    """
+    match = compile_pattern(pattern)
+    for path, entry in gitindex.list_tracked_files(search_path):
+        if not match(os.path.basename(path)):
+            continue
+        size = entry.size
+        if size == 0:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                continue
+        yield FileInfo(Path(path), size)
+
+
+def compile_pattern(pattern):
+    """Return a function that tells if a file name matches the pattern.
+
+    Like `Path.glob`, this is case-insensitive on Windows only.
+    """
+    regex = re.compile(fnmatch.translate(os.path.normcase(pattern)))
+    return lambda name: regex.match(os.path.normcase(name)) is not None
+
+
+def scan_directory(directory, match):
+    """List the directory.
+
+    Return information on the files whose names are accepted by
+    ``match`` as well as the paths of the subdirectories (not including
+    symbolic links to directories).
+
+    As with `os.walk`, directories that cannot be listed and entries
+    that vanish while being looked at are silently skipped.
+    """
+    file_infos = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif match(entry.name) and entry.is_file():
+                        file_infos.append(create_file_info(entry))
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return file_infos, subdirectories
+
+
+def create_file_info(entry):
+    """Collect information on a file (i.e. its size).
+
+    The directory entry caches the result of the `stat()` call (which
+    follows symbolic links, just as `Path.stat` does).
+    """
+    size = entry.stat().st_size
+    return FileInfo(Path(entry.path), size)
+
+
+def collect_directory_sizes(search_path, pattern, depth):
+    """Yield the disk space used beneath each directory that is
+    ``depth`` levels beneath the search path.
+
+    Sizes are summed up bottom-up during a single depth-first walk.
+    Only the directories on the path to the one currently being scanned
+    (and their yet unvisited subdirectories) are kept in memory.
+    """
+    match = compile_pattern(pattern)
+    seen_inodes = set()
+
+    def scan(directory, level):
+        total, subdirectories = scan_directory_usage(
+            directory, match, seen_inodes)
+        subdirectories.reverse()
+        return [directory, level, subdirectories, total]
+
+    stack = [scan(search_path, 0)]
+    while stack:
+        directory, level, subdirectories, total = stack[-1]
+        if subdirectories:
+            stack.append(scan(subdirectories.pop(), level + 1))
+            continue
+
+        stack.pop()
+        if level == depth:
+            yield FileInfo(Path(directory), total)
+        if stack:
+            stack[-1][3] += total
+
+
+def scan_directory_usage(directory, match, seen_inodes):
+    """List the directory.
+
+    Return the disk space allocated for the directory itself and the
+    (non-directory) entries whose names are accepted by ``match`` as
+    well as the paths of the subdirectories.
+
+    Symbolic links are not followed.  Files with multiple hard links are
+    only counted the first time one of them is encountered, which is
+    tracked in ``seen_inodes``.
+    """
+    total = 0
+    subdirectories = []
+    try:
+        if match(os.path.basename(directory)):
+            total += get_allocated_size(os.lstat(directory))
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                        continue
+                    if not match(entry.name):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if stat.st_nlink > 1:
+                    inode = (stat.st_dev, stat.st_ino)
+                    if inode in seen_inodes:
+                        continue
+                    seen_inodes.add(inode)
+
+                total += get_allocated_size(stat)
+    except OSError:
+        pass
+    return total, subdirectories
 
 
-def collect_file_paths(search_path, pattern):
-    """List all files along the path."""
-    for directory, subdirectories, files in os.walk(search_path):
-        for file_path in Path(directory).glob(pattern):
-            yield file_path
+def get_allocated_size(stat):
+    """Return the disk space allocated for the file.
 
+    This can be less than the size for sparse files, and more for small
+    files.  Where it is not available (i.e. on Windows), the size is
+    used instead.
+    """
+    try:
+        return stat.st_blocks * 512
+    except AttributeError:
+        return stat.st_size
+
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS directories (
+        id INTEGER PRIMARY KEY,
+        parent_id INTEGER,
+        path BLOB NOT NULL UNIQUE,
+        mtime_ns INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS directories_parent_id
+        ON directories (parent_id);
+    CREATE TABLE IF NOT EXISTS files (
+        directory_id INTEGER NOT NULL,
+        name BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        PRIMARY KEY (directory_id, name)
+    );
+    CREATE INDEX IF NOT EXISTS files_size ON files (size);
+"""
+
+SUBTREE = """
+    WITH RECURSIVE subtree(id) AS (
+        SELECT ?
+        UNION ALL
+        SELECT directories.id
+        FROM directories JOIN subtree ON directories.parent_id = subtree.id
+    )
+"""
+
+
+def open_index(filename, search_path):
+    """Open (or create) the index of the search path's files.
+
+    Paths are stored relative to the search path, so an index is bound
+    to the search path it was created for.
+    """
+    root = os.path.abspath(search_path)
+    connection = sqlite3.connect(filename)
+    with connection:
+        connection.executescript(INDEX_SCHEMA)
+        connection.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('root', ?)",
+            (root,))
+        indexed_root, = connection.execute(
+            "SELECT value FROM meta WHERE key = 'root'").fetchone()
+    if indexed_root != root:
+        connection.close()
+        raise ValueError('The index {} was created for {}, not {}.'
+                         .format(filename, indexed_root, root))
+    return connection
+
+
+def refresh_index(connection, search_path):
+    """Bring the index up to date with the file system.
+
+    Only directories whose modification time changed since they were
+    indexed are listed again (which is exactly the case if entries were
+    added, removed, or renamed).  Other directories only cost a `stat()`
+    call to find that out.
+    """
+    with connection:
+        directories = [(b'', None)]
+        while directories:
+            relative_path, parent_id = directories.pop()
+            directories.extend(refresh_indexed_directory(
+                connection, search_path, relative_path, parent_id))
+
+
+def refresh_indexed_directory(connection, search_path, relative_path,
+                              parent_id):
+    """Update the index for a single directory.
+
+    Return the (relative path, ID) pairs of its subdirectories.
+    """
+    directory = os.path.join(search_path, os.fsdecode(relative_path))
+    row = connection.execute(
+        'SELECT id, mtime_ns FROM directories WHERE path = ?',
+        (relative_path,)).fetchone()
+
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        if row is not None:
+            delete_indexed_subtree(connection, row[0])
+        return []
+
+    if row is None:
+        directory_id = connection.execute(
+            'INSERT INTO directories (parent_id, path) VALUES (?, ?)',
+            (parent_id, relative_path)).lastrowid
+    elif row[1] == mtime_ns:
+        return connection.execute(
+            'SELECT path, id FROM directories WHERE parent_id = ?',
+            (row[0],)).fetchall()
+    else:
+        directory_id = row[0]
+
+    files = []
+    subdirectory_names = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectory_names.append(os.fsencode(entry.name))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files.append((directory_id, os.fsencode(entry.name),
+                                      stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    pass
+    except OSError:
+        # Have another try next time.
+        mtime_ns = None
+
+    connection.execute(
+        'UPDATE directories SET mtime_ns = ? WHERE id = ?',
+        (mtime_ns, directory_id))
+    connection.execute(
+        'DELETE FROM files WHERE directory_id = ?', (directory_id,))
+    connection.executemany(
+        'INSERT INTO files (directory_id, name, size, mtime_ns) '
+        'VALUES (?, ?, ?, ?)', files)
+
+    subdirectory_paths = {
+        os.path.join(relative_path, name): name
+        for name in subdirectory_names}
+    for path, id_ in connection.execute(
+            'SELECT path, id FROM directories WHERE parent_id = ?',
+            (directory_id,)).fetchall():
+        if path not in subdirectory_paths:
+            delete_indexed_subtree(connection, id_)
+
+    return [(path, directory_id) for path in subdirectory_paths]
+
+
+def delete_indexed_subtree(connection, directory_id):
+    """Remove a directory and everything beneath it from the index."""
+    connection.execute(
+        SUBTREE + 'DELETE FROM files WHERE directory_id IN subtree',
+        (directory_id,))
+    connection.execute(
+        SUBTREE + 'DELETE FROM directories WHERE id IN subtree',
+        (directory_id,))
+
+
+def query_index(connection, search_path, pattern):
+    """Yield information on the indexed files matching the pattern,
+    biggest first.
+    """
+    match = compile_pattern(pattern)
+    connection.create_function(
+        'match_name', 1, lambda name: match(os.fsdecode(name)),
+        deterministic=True)
+    condition = 'WHERE match_name(files.name)' if pattern != '*' else ''
+    rows = connection.execute(
+        'SELECT directories.path, files.name, files.size '
+        'FROM files JOIN directories ON files.directory_id = directories.id '
+        + condition + ' ORDER BY files.size DESC')
+    for directory, name, size in rows:
+        path = Path(search_path, os.fsdecode(directory), os.fsdecode(name))
+        yield FileInfo(path, size)
+
+
+def take_biggest(file_infos, limit):
+    """Take the biggest files from file information objects that are
+    ordered by size, descending (including all files that have the same
+    size as the last one, so that ties can be broken as usual).
+    """
+    for count, file_info in enumerate(file_infos):
+        if count == limit:
+            smallest_size = file_info.size
+        if count >= limit and file_info.size < smallest_size:
+            break
+        yield file_info
+
+
+def get_size_sort_key(file_info):
+    """Sort by size and, to be independent of the order the files were
+    found in, files of the same size by path.
+    """
+    return file_info.size, Descending(file_info.path)
+
+
+@total_ordering
+class Descending(object):
+    """Wrap a value to reverse its sort order."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
 
-def create_file_info(file_path):
-    """Collect information on a file (i.e. its size)."""
-    size = file_path.stat().st_size
-    return FileInfo(file_path, size)
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
 
 
 def collect_biggest_files(file_infos, limit):
     """Determine the biggest files."""
-    return collect_highest(file_infos, attrgetter('size'), limit)
+    return collect_highest(file_infos, get_size_sort_key, limit)
 
 
 def collect_highest(iterable, sort_key, limit):
     """Return the highest elements from the iterable, considering the
     value returned by the sort key function ``sort_key``, but no more
     than ``limit``.
+
+    Only ``limit`` elements are kept at any time (in a heap), so this
+    takes O(n log limit) time and O(limit) memory.
+    """
+    return nlargest(limit, iterable, key=sort_key)
+
+
+def collect_highest_per_group(iterable, sort_key, group_keys, limit):
+    """Like `collect_highest`, but determine the highest elements
+    separately for each group.
+
+    ``group_keys`` maps names to functions that return the group an
+    element belongs to.  All of them are evaluated during a single pass
+    over the iterable.  The result maps each name to a dictionary which
+    in turn maps each group to its highest elements.
     """
-    def update_with_item(items, item):
-        return sorted(items + [item], key=sort_key, reverse=True)[:limit]
+    heaps = {name: defaultdict(list) for name in group_keys}
+    if limit > 0:
+        for index, item in enumerate(iterable):
+            # The negated index lets earlier elements win ties, just as
+            # `collect_highest` does.
+            entry = (sort_key(item), -index, item)
+            for name, group_key in group_keys.items():
+                heap = heaps[name][group_key(item)]
+                if len(heap) < limit:
+                    heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapreplace(heap, entry)
+
+    return {
+        name: {
+            group: [entry[2] for entry in sorted(heap, reverse=True)]
+            for group, heap in groups.items()
+        }
+        for name, groups in heaps.items()
+    }
 
-    return reduce(update_with_item, iterable, [])
+
+def get_extension(file_info):
+    """Return the file's extension, or a placeholder if it has none."""
+    return file_info.path.suffix.lower() or '(none)'
+
+
+def get_top_directory(search_path, file_info):
+    """Return the top-level directory (relative to the search path) the
+    file is located in.
+    """
+    parts = file_info.path.relative_to(search_path).parts
+    return parts[0] if len(parts) > 1 else '.'
+
+
+def get_owner(file_info):
+    """Return the name of the user owning the file, or a placeholder if
+    it cannot be looked up (e.g. as it was deleted, but is still tracked
+    in the Git index).
+
+    NOTE: This requires another `stat()` call per file.
+    """
+    try:
+        uid = file_info.path.stat().st_uid
+    except OSError:
+        return '(unknown)'
+    return get_user_name(uid)
+
+
+_user_names = {}
+
+
+def get_user_name(uid):
+    """Look up (and cache) the name for the user ID."""
+    try:
+        return _user_names[uid]
+    except KeyError:
+        try:
+            name = pwd.getpwuid(uid).pw_name
+        except (AttributeError, KeyError):
+            name = str(uid)
+        _user_names[uid] = name
+        return name
+
+
+GROUP_KEYS = {
+    'extension': lambda search_path: get_extension,
+    'owner': lambda search_path: get_owner,
+    'top-dir': lambda search_path: partial(get_top_directory, search_path),
+}
+
+
+def create_group_keys(names, search_path):
+    """Create the group key functions for the given names."""
+    return {name: GROUP_KEYS[name](search_path) for name in names}
+
+
+def format_grouped_results(groupings):
+    """Format the file information objects, group by group."""
+    separator = False
+    for name in sorted(groupings):
+        for group, file_infos in sorted(groupings[name].items()):
+            if separator:
+                yield ''
+            separator = True
+            yield '{}: {}'.format(name, group)
+            for line in format_results(file_infos):
+                yield line
+
+    if not separator:
+        yield 'No files were found.'
 
 
 def format_results(file_infos):
@@ -98,10 +731,53 @@ def format_results(file_infos):
 def main():
     args = parse_args()
 
-    file_infos = collect_file_infos(args.path, args.pattern)
-    biggest_files = collect_biggest_files(file_infos, args.max_files)
+    if args.by_dir:
+        directory_infos = collect_directory_sizes(
+            args.path, args.pattern, args.depth)
+        try:
+            biggest_directories = collect_biggest_files(
+                directory_infos, args.max_files)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        for line in format_results(biggest_directories):
+            print(line)
+        return
+
+    if args.index:
+        try:
+            connection = open_index(args.index, args.path)
+        except (ValueError, sqlite3.Error) as e:
+            sys.exit(e)
+        try:
+            refresh_index(connection, args.path)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        file_infos = query_index(connection, args.path, args.pattern)
+        if not args.group_by:
+            file_infos = take_biggest(file_infos, args.max_files)
+    elif args.tracked:
+        file_infos = collect_tracked_file_infos(args.path, args.pattern)
+    elif args.jobs > 1:
+        file_infos = collect_file_infos_concurrently(
+            args.path, args.pattern, args.jobs)
+    else:
+        file_infos = collect_file_infos(args.path, args.pattern)
+
+    try:
+        if args.group_by:
+            group_keys = create_group_keys(args.group_by, args.path)
+            groupings = collect_highest_per_group(
+                file_infos, get_size_sort_key, group_keys, args.max_files)
+            lines = format_grouped_results(groupings)
+        else:
+            biggest_files = collect_biggest_files(file_infos, args.max_files)
+            lines = format_results(biggest_files)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except gitindex.GitIndexError as e:
+        sys.exit(e)
 
-    for line in format_results(biggest_files):
+    for line in lines:
         print(line)
 
 
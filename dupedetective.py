@@ -7,26 +7,77 @@ Dupe Detective
 
 Find duplicate files.
 
-For the sake of speed, files are compared by size as the first step.  Only if
-multiple files have the same size, MD5 hashes of their contents are calculated
-to figure out if they are really identical.
+For the sake of speed, candidates are eliminated in stages, each one more
+expensive than the previous one:
 
-Alternatives to MD5 include ``adler32()`` and ``crc32()`` from ``zlib``.  They
-are much faster, although they have their own weaknesses, and especially
-Adler-32 looks bad when little data is available.
+1. Files are compared by size.
+2. Only if multiple files have the same size, hashes of their first and
+   last 64 KiB are calculated.  For smaller files, this already covers their
+   whole contents.
+3. Only files that still collide are read completely.  Small numbers of them
+   are compared block by block, side by side, so reading stops as soon as
+   they are found to differ.  Larger numbers of them are hashed in full.
+
+MD5 is used by default.  BLAKE2b and SHA-1 can be selected instead, and so
+can the non-cryptographic (but much faster) xxHash functions if the
+``xxhash`` module is installed.  ``adler32()`` and ``crc32()`` from ``zlib``
+are fast as well, but their 32 bits are too few to trust a match, and
+especially Adler-32 looks bad when little data is available.
 
 :Copyright: 2008 Jochen Kupperschmidt
 :Date: 16-May-2008
 :License: MIT
 """
 
-from __future__ import with_statement
-from collections import defaultdict
+from argparse import ArgumentParser
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import fnmatch
+from functools import partial, reduce
 import hashlib
-from itertools import ifilter
+import heapq
+import io
+from itertools import groupby
+import json
+from operator import itemgetter
 import os
+import shutil
+import signal
+import sqlite3
+from stat import S_ISREG
+import struct
 import sys
+import tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # not available on Windows
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+HASH_FUNCTIONS = {
+    'blake2b': hashlib.blake2b,
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+}
+if xxhash is not None:
+    HASH_FUNCTIONS['xxh64'] = xxhash.xxh64
+    HASH_FUNCTIONS['xxh128'] = xxhash.xxh3_128
+
+
+# The number of bytes at the start and at the end of a file to compare before
+# considering the rest of it.
+PARTIAL_SIZE = 64 * 1024
+
+# The maximum number of files to compare side by side (i.e. to keep open at
+# the same time) instead of hashing them one after another.
+MAX_LOCKSTEP_FILES = 16
+
+# The number of bytes to read at once when reading whole files.
+BLOCK_SIZE = 1024 * 1024
 
 
 def get_filenames(path, filemask):
@@ -35,49 +86,775 @@ def get_filenames(path, filemask):
         for filename in fnmatch.filter(files, filemask):
             yield os.path.join(root, filename)
 
-def read_file(filename, block_size=8192):
-    """Iterate block-wise over file contents."""
+def read_file(filename, block_size=BLOCK_SIZE):
+    """Iterate block-wise over file contents.
+
+    The blocks are views on the same buffer, which is overwritten by the
+    next one, so they need to be processed before moving on.
+    """
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(filename, 'rb', buffering=0) as f:
+        for length in iter(lambda: f.readinto(buffer), 0):
+            yield view[:length]
+
+def read_file_ends(filename, size):
+    """Return the first and the last ``PARTIAL_SIZE`` bytes of the file,
+    or its whole contents if it is not bigger than twice that.
+    """
     with open(filename, 'rb') as f:
-        for block in iter(lambda: f.read(block_size), ''):
-            yield block
+        if size <= 2 * PARTIAL_SIZE:
+            return [f.read()]
+        head = f.read(PARTIAL_SIZE)
+        f.seek(-PARTIAL_SIZE, os.SEEK_END)
+        return [head, f.read(PARTIAL_SIZE)]
 
-def calc_hash(iterable):
-    """Calculate the MD5 hash for the iterable's data."""
+def calc_hash(iterable, hash_func=hashlib.md5):
+    """Calculate the hash for the iterable's data."""
     return reduce(lambda m, data: m.update(data) or m,
-        iterable, hashlib.md5()).hexdigest()
+        iterable, hash_func()).hexdigest()
 
 def filter_groups(iterable, key_func):
     """Extract value sequences with more than one element."""
     d = defaultdict(set)
     for item in iterable:
         d[key_func(item)].add(item)
-    return ifilter(lambda x: len(x[1]) > 1, d.iteritems())
+    return filter(lambda x: len(x[1]) > 1, d.items())
+
+def compare_in_lockstep(filenames, hash_func=hashlib.md5,
+                        block_size=BLOCK_SIZE):
+    """Read the files side by side and yield the hash and the names of
+    each group of identical files.
+
+    Files are set aside as soon as they differ from all others, so they are
+    not read any further.
+    """
+    files = {}
+    try:
+        for filename in filenames:
+            files[filename] = open(filename, 'rb', buffering=0)
+
+        # Files in the same group have been identical so far, so a single
+        # hash per group suffices.
+        groups = [(hash_func(), list(filenames))]
+        while groups:
+            next_groups = []
+            for hash, group in groups:
+                by_block = defaultdict(list)
+                for filename in group:
+                    by_block[files[filename].read(block_size)].append(filename)
+
+                for block, identical in by_block.items():
+                    if len(identical) < 2:
+                        files.pop(identical[0]).close()
+                        continue
+                    group_hash = hash.copy() if len(by_block) > 1 else hash
+                    if block:
+                        group_hash.update(block)
+                        next_groups.append((group_hash, identical))
+                    else:
+                        yield group_hash.hexdigest(), set(identical)
+            groups = next_groups
+    finally:
+        for f in files.values():
+            f.close()
+
+def find_duplicates(iterable, hash_name='md5', jobs=1, cache=None,
+                    max_records=None):
+    """Compare file size and, if equal, hash sums.
+
+    With more than one job, groups of files of the same size are compared
+    by a pool of worker processes (see `schedule_by_device`), and the
+    duplicates are yielded in no particular order.
+
+    If a `HashCache` is given, digests found in it are used instead of
+    reading the files, and newly calculated ones are added to it.
+
+    Files that are hard links of each other are only compared (and
+    reported) once, by the first name they were found under.  Thus, the
+    names yielded for each group of duplicates are given as a mapping of
+    those names to lists of the other names of the same file.  Along with
+    it comes a mapping of those names to the device and inode of their
+    files, as found when the files were listed.
+
+    If ``max_records`` is given, files are grouped by size with
+    `group_by_size_externally` so that memory usage is limited.
+    """
+    if max_records:
+        size_groups = group_by_size_externally(iterable, max_records)
+    else:
+        size_groups = group_by_size(iterable)
+
+    def _create_tasks():
+        for size, stats, links in size_groups:
+            known_digests = {}
+            if cache is not None:
+                known_digests = cache.get_all(stats, hash_name)
+            args = (size, set(stats), hash_name, known_digests)
+            yield (stats, links), args
+
+    def _update_cache(stats, result):
+        duplicates, new_digests = result
+        if cache is not None:
+            cache.put_all(stats, hash_name, new_digests)
+        return duplicates
+
+    tasks = _create_tasks()
+    if jobs > 1:
+        tasks_by_device = (
+            (get_devices(context[0].values()), (context, args))
+            for context, args in tasks)
+        results = schedule_by_device(
+            compare_size_group, tasks_by_device, jobs)
+    else:
+        results = ((context, compare_size_group(*args))
+                   for context, args in tasks)
+
+    for (stats, links), result in results:
+        for size, hash, fnames in _update_cache(stats, result):
+            fnames = sorted(fnames)
+            yield (size, hash,
+                   {fname: links.get(fname, []) for fname in fnames},
+                   {fname: (stats[fname].st_dev, stats[fname].st_ino)
+                    for fname in fnames})
+
+def group_by_size(filenames):
+    """Group the files by size.
+
+    Only the first name of each file (i.e. inode) is considered, and the
+    others are recorded as links to it.  Yield the size, a mapping of
+    names to the status of their files, and a mapping of names to lists
+    of other names of the same files (if any) for each size shared by
+    multiple files.
+    """
+    sizes = defaultdict(list)
+    for filename, stat in stat_files(filenames):
+        sizes[stat.st_size].append((filename, stat))
+
+    for size, files in sizes.items():
+        if len(files) > 1:
+            for group in group_by_inode(size, files):
+                yield group
+
+def group_by_size_externally(filenames, max_records):
+    """Group the files by size, like `group_by_size`, but without keeping
+    more than ``max_records`` files in memory at a time (except for those
+    of the same size).
+
+    File records are collected in runs, which are sorted by size and
+    written to temporary files.  The runs are then merged, so that files
+    of the same size come up one after another, and each size is
+    processed as soon as it is complete.
+
+    No more than `MAX_MERGE_RUNS` runs are merged at once.  Whenever that
+    many runs of the same generation have been written, they are merged
+    into a run of the next generation, so the number of open runs only
+    grows with the logarithm of the number of files.
+    """
+    generations = []
+    try:
+        records = []
+        for filename, stat in stat_files(filenames):
+            records.append((stat.st_size, stat.st_dev, stat.st_ino,
+                            stat.st_mtime_ns, os.fsencode(filename)))
+            if len(records) >= max_records:
+                records.sort()
+                add_run(generations, write_run(records))
+                records = []
+        if records:
+            records.sort()
+            add_run(generations, write_run(records))
+        del records
+
+        runs = [run for generation in generations for run in generation]
+        generations = [runs]
+        while len(runs) > MAX_MERGE_RUNS:
+            merge_runs(runs, MAX_MERGE_RUNS)
+
+        merged = heapq.merge(*map(read_run, runs))
+        for size, records in groupby(merged, key=itemgetter(0)):
+            files = [
+                (os.fsdecode(path), FileStatus(size, dev, ino, mtime_ns))
+                for size, dev, ino, mtime_ns, path in records]
+            if len(files) > 1:
+                for group in group_by_inode(size, files):
+                    yield group
+    finally:
+        for generation in generations:
+            for run in generation:
+                run.close()
+
+FileStatus = namedtuple('FileStatus', 'st_size st_dev st_ino st_mtime_ns')
+
+RUN_RECORD_HEADER = struct.Struct('=QQQqL')
+
+# The maximum number of runs to merge at once, and the number of bytes to
+# buffer when reading each of them.
+MAX_MERGE_RUNS = 64
+RUN_BUFFER_SIZE = 64 * 1024
+
+def add_run(generations, run):
+    """Add the run to the first generation, and merge each generation
+    that is full into a run of the next one.
+    """
+    for generation in generations:
+        generation.append(run)
+        if len(generation) < MAX_MERGE_RUNS:
+            return
+        merge_runs(generation, len(generation))
+        run = generation.pop()
+    generations.append([run])
+
+def merge_runs(runs, count):
+    """Replace the first ``count`` runs with a single run of their records
+    (appended to the runs).
+    """
+    merged = write_run(heapq.merge(*map(read_run, runs[:count])))
+    for run in runs[:count]:
+        run.close()
+    del runs[:count]
+    runs.append(merged)
+
+def write_run(records):
+    """Write the records (sorted by the caller) to a temporary file."""
+    run = tempfile.TemporaryFile()
+    try:
+        writer = io.BufferedWriter(run, RUN_BUFFER_SIZE)
+        for record in records:
+            writer.write(RUN_RECORD_HEADER.pack(*record[:4], len(record[4])))
+            writer.write(record[4])
+        writer.detach()
+    except BaseException:
+        run.close()
+        raise
+    return run
+
+def read_run(run):
+    """Iterate over the records in a temporary file."""
+    run.seek(0)
+    reader = io.BufferedReader(run, RUN_BUFFER_SIZE)
+    while True:
+        header = reader.read(RUN_RECORD_HEADER.size)
+        if not header:
+            return
+        size, dev, ino, mtime_ns, path_length = \
+            RUN_RECORD_HEADER.unpack(header)
+        yield size, dev, ino, mtime_ns, reader.read(path_length)
+
+def stat_files(filenames):
+    """Yield the names of the regular files that (still) exist along with
+    their status.
+
+    Symbolic links are skipped rather than followed, so they are not
+    mistaken for hard links of their targets.
+    """
+    for filename in filenames:
+        try:
+            stat = os.lstat(filename)
+        except OSError:
+            continue
+        if S_ISREG(stat.st_mode):
+            yield filename, stat
+
+def group_by_inode(size, files):
+    """Group files of the same size (given as pairs of name and status)
+    by inode, as described for `group_by_size`, if there are multiple
+    inodes.
+    """
+    inodes = {}
+    links = defaultdict(list)
+    for filename, stat in files:
+        inode = (stat.st_dev, stat.st_ino)
+        if inode in inodes:
+            links[inodes[inode][0]].append(filename)
+        else:
+            inodes[inode] = (filename, stat)
+
+    if len(inodes) > 1:
+        stats = dict(inodes.values())
+        yield size, stats, {fname: links[fname]
+                            for fname in stats if fname in links}
+
+def compare_size_group(size, filenames, hash_name, known_digests):
+    """Find the duplicates among files of the same size.
+
+    ``known_digests`` maps (filename, kind) pairs to digests that do not
+    need to be calculated again, with the kind being either ``'partial'``
+    or ``'full'``.
+
+    Return a list of the size, hash, and names of each group of identical
+    files, and a mapping of the digests that were calculated, in the same
+    form as ``known_digests``.
+    """
+    hash_func = HASH_FUNCTIONS[hash_name]
+    new_digests = {}
+
+    def _get_digest(kind, calc, filename):
+        try:
+            return known_digests[filename, kind]
+        except KeyError:
+            digest = new_digests[filename, kind] = calc(filename)
+            return digest
 
-def find_duplicates(iterable):
-    """Compare file size and, if equal, hash sums."""
-    def _get_size(filename):
-        return int(os.path.getsize(filename))
+    def _calc_partial_hash(filename):
+        return calc_hash(read_file_ends(filename, size), hash_func)
 
     def _calc_hash(filename):
-        return calc_hash(read_file(filename))
+        return calc_hash(read_file(filename), hash_func)
 
-    for size, fnames in filter_groups(iterable, _get_size):
-        for hash, fnames2 in filter_groups(fnames, _calc_hash):
-            yield size, hash, fnames2
+    duplicates = []
+    for hash, fnames in filter_groups(
+            filenames, partial(_get_digest, 'partial', _calc_partial_hash)):
+        if size <= 2 * PARTIAL_SIZE:
+            # The whole contents have been hashed already.
+            duplicates.append((size, hash, fnames))
+        elif len(fnames) <= MAX_LOCKSTEP_FILES and not any(
+                (fname, 'full') in known_digests for fname in fnames):
+            for hash, fnames2 in compare_in_lockstep(fnames, hash_func):
+                duplicates.append((size, hash, fnames2))
+                for fname in fnames2:
+                    new_digests[fname, 'full'] = hash
+        else:
+            for hash, fnames2 in filter_groups(
+                    fnames, partial(_get_digest, 'full', _calc_hash)):
+                duplicates.append((size, hash, fnames2))
+    return duplicates, new_digests
 
-def main(path, mask='*'):
+def get_devices(stats):
+    """Return the IDs of the devices the files are stored on."""
+    return frozenset(stat.st_dev for stat in stats)
+
+def is_rotational(device):
+    """Tell if the device is a spinning disk.
+
+    This is only known on Linux.  Elsewhere (and for network file systems)
+    the device is assumed not to be one.
+    """
+    path = '/sys/dev/block/%d:%d' % (os.major(device), os.minor(device))
+    # Partitions do not have a queue of their own, but their disk has.
+    for queue_path in [path + '/queue', path + '/../queue']:
+        try:
+            with open(os.path.join(queue_path, 'rotational')) as f:
+                return f.read().strip() == '1'
+        except OSError:
+            pass
+    return False
+
+def schedule_by_device(func, tasks, jobs):
+    """Call the function in a pool of ``jobs`` worker processes and yield
+    the results as soon as they are available.
+
+    Each task is a pair of the IDs of the devices it reads from and a pair
+    of some context (which is passed along with the result) and the
+    arguments to call the function with.  Spinning disks are read by only
+    one worker at a time so that the disk heads do not have to jump back
+    and forth between files.  All other devices are read by as many
+    workers as are available.
+    """
+    limits = {}
+    in_use = defaultdict(int)
+    pending = []
+    running = {}
+    tasks = iter(tasks)
+    exhausted = False
+
+    def is_available(devices):
+        for device in devices:
+            if device not in limits:
+                limits[device] = 1 if is_rotational(device) else jobs
+            if in_use[device] >= limits[device]:
+                return False
+        return True
+
+    executor = ProcessPoolExecutor(jobs, initializer=ignore_interrupts)
+    try:
+        while True:
+            # Look ahead for tasks on devices that are not busy yet.
+            while not exhausted and len(pending) < jobs * 16:
+                try:
+                    pending.append(next(tasks))
+                except StopIteration:
+                    exhausted = True
+
+            for task in list(pending):
+                if len(running) >= jobs * 2:
+                    break
+                devices, (context, args) = task
+                if is_available(devices):
+                    pending.remove(task)
+                    for device in devices:
+                        in_use[device] += 1
+                    future = executor.submit(func, *args)
+                    running[future] = devices, context
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                devices, context = running.pop(future)
+                for device in devices:
+                    in_use[device] -= 1
+                yield context, future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+class HashCache(object):
+    """A persistent cache of file digests.
+
+    Digests are stored per device and inode, along with the size and the
+    modification time of the file at the time it was read.  If either of
+    them changed since, the digest is considered invalid.
+
+    The least recently used digests are evicted as soon as the cache holds
+    more than ``max_entries`` of them.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS digests (
+            device INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            hash_name TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            last_used INTEGER NOT NULL,
+            PRIMARY KEY (device, inode, hash_name, kind)
+        );
+        CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used);
+    """
+
+    def __init__(self, filename, max_entries):
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(self.SCHEMA)
+        self.max_entries = max_entries
+        self.run, = self.connection.execute(
+            'SELECT COALESCE(MAX(last_used), 0) + 1 FROM digests').fetchone()
+
+    def get_all(self, stats, hash_name):
+        """Return the valid digests for the files with the given status,
+        as a mapping of (filename, kind) pairs to digests.
+        """
+        digests = {}
+        for filename, stat in stats.items():
+            rows = self.connection.execute(
+                'SELECT kind, size, mtime_ns, digest FROM digests '
+                'WHERE device = ? AND inode = ? AND hash_name = ?',
+                (stat.st_dev, stat.st_ino, hash_name)).fetchall()
+            valid = [(kind, digest)
+                     for kind, size, mtime_ns, digest in rows
+                     if size == stat.st_size and mtime_ns == stat.st_mtime_ns]
+            for kind, digest in valid:
+                digests[filename, kind] = digest
+            if valid:
+                self.connection.execute(
+                    'UPDATE digests SET last_used = ? '
+                    'WHERE device = ? AND inode = ? AND hash_name = ?',
+                    (self.run, stat.st_dev, stat.st_ino, hash_name))
+        return digests
+
+    def put_all(self, stats, hash_name, digests):
+        """Store digests, given as a mapping of (filename, kind) pairs to
+        digests, for the files with the given status.
+        """
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO digests '
+            '(device, inode, hash_name, kind, size, mtime_ns, digest, '
+            'last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(stats[filename].st_dev, stats[filename].st_ino, hash_name,
+              kind, stats[filename].st_size, stats[filename].st_mtime_ns,
+              digest, self.run)
+             for (filename, kind), digest in digests.items()])
+
+    def close(self):
+        """Evict the least recently used digests if there are too many,
+        and save the cache.
+        """
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM digests WHERE rowid IN ('
+                '  SELECT rowid FROM digests ORDER BY last_used DESC'
+                '  LIMIT -1 OFFSET ?)', (self.max_entries,))
+        self.connection.close()
+
+def link_duplicates(filenames, method):
+    """Replace all but the first of the duplicates by links to it.
+
+    ``filenames`` maps names to lists of other names of the same file (as
+    yielded by `find_duplicates`), and all of them are replaced.  Yield a
+    pair of the name that was replaced and an error message (or `None` if
+    it was replaced successfully).
+    """
+    source = min(filenames)
+    for fname, other_names in sorted(filenames.items()):
+        if fname == source:
+            continue
+        for target in [fname] + other_names:
+            if os.path.islink(target):
+                continue
+            try:
+                replace_with_link(source, target, method)
+            except (OSError, ValueError) as e:
+                yield target, str(e)
+            else:
+                yield target, None
+
+def replace_with_link(source, target, method):
+    """Replace the target file by a link (of the method ``'hard'`` or
+    ``'reflink'``) to the source file.
+
+    The link is created next to the target and only moved over it (which
+    is an atomic operation) after both files have been verified to be
+    identical, byte by byte, and the target has not changed since.
+    """
+    target_stat = os.stat(target)
+    if method == 'reflink':
+        extents = get_extents(source)
+        if extents and extents == get_extents(target):
+            raise ValueError('already shares its data with ' + source)
+
+    directory, name = os.path.split(target)
+    temporary = os.path.join(
+        directory, '.%s.%d.dupedetective' % (name, os.getpid()))
+    if method == 'hard':
+        os.link(source, temporary)
+    else:
+        clone_file(source, temporary)
+        shutil.copystat(target, temporary)
+
+    try:
+        if not compare_files(source, target):
+            raise ValueError('differs from ' + source)
+        stat = os.stat(target)
+        if (stat.st_ino, stat.st_size, stat.st_mtime_ns) != (
+                target_stat.st_ino, target_stat.st_size,
+                target_stat.st_mtime_ns):
+            raise ValueError('changed while being compared')
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+def compare_files(filename1, filename2, block_size=BLOCK_SIZE):
+    """Tell if the files have identical contents."""
+    with open(filename1, 'rb', buffering=0) as f1, \
+            open(filename2, 'rb', buffering=0) as f2:
+        while True:
+            block = f1.read(block_size)
+            if block != f2.read(block_size):
+                return False
+            if not block:
+                return True
+
+# from <linux/fs.h>
+FICLONE = 0x40049409
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_EXTENT_LAST = 0x1
+FIEMAP_EXTENT_UNKNOWN = 0x2
+FIEMAP_EXTENT_DELALLOC = 0x4
+FIEMAP_EXTENT_DATA_INLINE = 0x200
+FIEMAP_EXTENT_UNSHARABLE = (FIEMAP_EXTENT_UNKNOWN | FIEMAP_EXTENT_DELALLOC |
+                            FIEMAP_EXTENT_DATA_INLINE)
+FIEMAP_EXTENTS_PER_CALL = 64
+
+def clone_file(source, target):
+    """Create the target as a copy of the source that shares its data
+    (a reflink), which is only supported by some file systems (e.g. Btrfs
+    and XFS) on Linux.
+    """
+    if fcntl is None:
+        raise ValueError('reflinks are not supported on this platform')
+    with open(source, 'rb') as src, open(target, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target)
+            raise
+
+def get_extents(filename):
+    """Return the logical and physical offsets and the lengths of the
+    extents the file's data is stored in, or `None` if that is unknown.
+
+    Files that share all of their extents are reflinks of each other.
+    """
+    if fcntl is None:
+        return None
+    header = struct.Struct('=QQLLLL')
+    extent = struct.Struct('=QQQQQLLLL')
+    extents = []
+    start = 0
+    try:
+        with open(filename, 'rb') as f:
+            while True:
+                request = bytearray(
+                    header.size + FIEMAP_EXTENTS_PER_CALL * extent.size)
+                header.pack_into(request, 0, start, 2 ** 64 - 1 - start, 0,
+                                 0, FIEMAP_EXTENTS_PER_CALL, 0)
+                fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, request)
+                mapped = header.unpack_from(request)[3]
+                if not mapped:
+                    return extents
+                for i in range(mapped):
+                    logical, physical, length, _, _, flags, _, _, _ = \
+                        extent.unpack_from(request,
+                                           header.size + i * extent.size)
+                    if flags & FIEMAP_EXTENT_UNSHARABLE:
+                        return None
+                    extents.append((logical, physical, length))
+                    if flags & FIEMAP_EXTENT_LAST:
+                        return extents
+                start = logical + length
+    except OSError:
+        return None
+
+def ignore_interrupts():
+    """Leave handling Ctrl-C to the main process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = ArgumentParser(description='Find duplicate files.')
+
+    parser.add_argument(
+        'path',
+        metavar='PATH')
+
+    parser.add_argument(
+        'mask',
+        metavar='MASK',
+        nargs='?',
+        default='*',
+        help='a pattern for the names of the files to compare, '
+             'e.g. "*.jpg" (default: *)')
+
+    parser.add_argument(
+        '--hash',
+        dest='hash_name',
+        choices=sorted(HASH_FUNCTIONS),
+        default='md5',
+        help='the hash function to identify file contents with '
+             '(default: md5)')
+
+    parser.add_argument(
+        '-j', '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of worker processes to compare files with; spinning '
+             'disks are still read by one of them at a time (default: 1)')
+
+    parser.add_argument(
+        '--cache',
+        dest='cache',
+        metavar='FILE',
+        help='keep digests in a cache file (created if not existing) to '
+             'avoid reading files that did not change since they were '
+             'hashed')
+
+    parser.add_argument(
+        '--cache-size',
+        dest='cache_size',
+        type=int,
+        default=1000000,
+        help='maximum number of digests to keep in the cache; the least '
+             'recently used ones are evicted first (default: 1000000)')
+
+    parser.add_argument(
+        '--link',
+        dest='link',
+        choices=['hard', 'reflink'],
+        help='replace duplicates by hard links or reflinks (copies that '
+             'share their data, on file systems that support them) to '
+             'the first of them')
+
+    parser.add_argument(
+        '--max-records',
+        dest='max_records',
+        type=int,
+        help='keep at most this many file records in memory while '
+             'grouping files by size, and spill the rest to temporary '
+             'files (default: no limit)')
+
+    parser.add_argument(
+        '-f', '--format',
+        dest='format',
+        choices=['text', 'jsonl', 'null'],
+        default='text',
+        help='output format for each group of duplicates, written as soon '
+             'as the group is confirmed: text for humans, a JSON object '
+             'per line (with size, digest, and paths with device, inode, '
+             'and other hard links), or NUL-terminated paths followed by '
+             'another NUL (default: text)')
+
+    return parser.parse_args()
+
+def format_text(size, hash, filenames, link_results):
+    """Format a group of duplicates for humans."""
+    yield '\n + %s, %d bytes' % (hash, size)
+    for filename, other_names in filenames.items():
+        yield '   - ' + filename
+        for other_name in other_names:
+            yield '     = ' + other_name
+    for target, error in link_results:
+        if error is None:
+            yield '   linked ' + target
+        else:
+            yield '   not linked %s: %s' % (target, error)
+
+def create_record(size, hash_name, hash, filenames, inodes):
+    """Assemble the details on a group of duplicates for JSON output."""
+    files = [{
+        'path': filename,
+        'device': inodes[filename][0],
+        'inode': inodes[filename][1],
+        'links': other_names,
+    } for filename, other_names in filenames.items()]
+    return {'size': size, 'hash': hash_name, 'digest': hash, 'files': files}
+
+def main():
     """Retrieve and display results."""
-    duplicates = list(find_duplicates(get_filenames(path, mask)))
-    if not duplicates:
-        return
-    print 'The following files are duplicates:'
-    for size, hash, filenames in duplicates:
-        print '\n + %s, %d bytes' % (hash, size)
-        for filename in filenames:
-            print '   -', filename
+    args = parse_args()
+    cache = HashCache(args.cache, args.cache_size) if args.cache else None
+    try:
+        duplicates = find_duplicates(
+            get_filenames(args.path, args.mask), args.hash_name, args.jobs,
+            cache, args.max_records)
+        for i, (size, hash, filenames, inodes) in enumerate(duplicates):
+            link_results = []
+            if args.link:
+                link_results = list(link_duplicates(filenames, args.link))
+
+            if args.format == 'jsonl':
+                record = create_record(size, args.hash_name, hash, filenames,
+                                       inodes)
+                record['linked'] = [target for target, error in link_results
+                                    if error is None]
+                record['not_linked'] = {target: error
+                                        for target, error in link_results
+                                        if error is not None}
+                print(json.dumps(record))
+            elif args.format == 'null':
+                for filename, other_names in filenames.items():
+                    for name in [filename] + other_names:
+                        sys.stdout.buffer.write(os.fsencode(name) + b'\0')
+                sys.stdout.buffer.write(b'\0')
+                for target, error in link_results:
+                    if error is not None:
+                        print('not linked %s: %s' % (target, error),
+                              file=sys.stderr)
+            else:
+                if i == 0:
+                    print('The following files are duplicates:')
+                for line in format_text(size, hash, filenames, link_results):
+                    print(line)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        if cache is not None:
+            cache.close()
 
 if __name__ == '__main__':
-    if len(sys.argv) not in (2, 3):
-        print 'usage: %s <path> [mask pattern]' % os.path.basename(sys.argv[0])
-        sys.exit(2)
-    main(*sys.argv[1:])
+    main()
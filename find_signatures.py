@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Signature Finder
+================
+
+Find files by the signatures at their beginning:
+
+- Unicode byte order marks (BOMs), including UTF-8's (which doesn't actually
+  say anything about byte order as that is a non-issue with UTF-8)
+- line endings (CRLF, LF, CR, or a mix of them)
+- NUL bytes, which mark binary content
+- shebangs (``#!``) naming the interpreter of a script
+
+Only the first few kilobytes of each file are read (so line endings and NUL
+bytes are only looked for in there), and directories can be scanned
+concurrently.
+
+UTF-8 BOMs can be stripped from the files they are found in.
+
+See http://en.wikipedia.org/wiki/Byte_Order_Mark
+
+Replaces ``find_bom.rb``.
+
+:Copyright: 2008-2026 Jochen Kupperschmidt
+:Date: 18-Oct-2026 (original release of ``find_bom.rb``: 14-Jul-2008)
+:License: MIT
+"""
+
+from argparse import ArgumentParser
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+import os
+import shutil
+import sys
+import tempfile
+
+
+# BOMs whose bytes start with another one's come before it.
+BOMS = [
+    ('UTF-32-BE', b'\x00\x00\xfe\xff'),
+    ('UTF-32-LE', b'\xff\xfe\x00\x00'),
+    ('UTF-8', b'\xef\xbb\xbf'),
+    ('UTF-16-BE', b'\xfe\xff'),
+    ('UTF-16-LE', b'\xff\xfe'),
+    ('UTF-7', b'+/v8'),
+    ('UTF-7', b'+/v9'),
+    ('UTF-7', b'+/v+'),
+    ('UTF-7', b'+/v/'),
+    ('UTF-1', b'\xf7\x64\x4c'),
+    ('UTF-EBCDIC', b'\xdd\x73\x66\x73'),
+    ('SCSU', b'\x0e\xfe\xff'),
+    ('BOCU-1', b'\xfb\xee\x28'),
+    ('GB-18030', b'\x84\x31\x95\x33'),
+]
+
+# Text in these encodings is decoded before looking for line breaks and
+# NUL characters (as its bytes contain NULs anyway).
+WIDE_ENCODINGS = {
+    'UTF-32-BE': 'utf-32-be',
+    'UTF-32-LE': 'utf-32-le',
+    'UTF-16-BE': 'utf-16-be',
+    'UTF-16-LE': 'utf-16-le',
+}
+
+# The number of bytes to read from the start of each file, and at once
+# when stripping a BOM.
+SAMPLE_SIZE = 8 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+VCS_DIRECTORIES = frozenset(['.bzr', '.git', '.hg', '.svn', 'CVS', '_darcs'])
+
+# The kinds of signatures to look for.
+KINDS = ['bom', 'crlf', 'lf', 'cr', 'mixed', 'binary', 'shebang']
+
+
+Signatures = namedtuple('Signatures', [
+    'bom', 'line_endings', 'binary', 'shebang'])
+
+
+def detect_signatures(sample):
+    """Detect the signatures in the file's beginning."""
+    bom = detect_bom(sample)
+    text = sample[len(bom[1]):] if bom is not None else sample
+    if bom is not None and bom[0] in WIDE_ENCODINGS:
+        text = text.decode(WIDE_ENCODINGS[bom[0]], 'replace')
+        cr, lf, nul, shebang = '\r', '\n', '\0', '#!'
+    else:
+        cr, lf, nul, shebang = b'\r', b'\n', b'\0', b'#!'
+
+    binary = nul in text
+    line_endings = None
+    if not binary:
+        if len(sample) == SAMPLE_SIZE and text.endswith(cr):
+            # The line feed may follow right after the sample.
+            text = text[:-1]
+        line_endings = detect_line_endings(text, cr, lf)
+
+    interpreter = None
+    if text.startswith(shebang):
+        first_line = text[2:].split(lf, 1)[0].strip()
+        if isinstance(first_line, bytes):
+            first_line = first_line.decode('utf-8', 'replace')
+        interpreter = first_line
+
+    return Signatures(bom[0] if bom is not None else None, line_endings,
+                      binary, interpreter)
+
+
+def detect_bom(sample):
+    """Return the name and the bytes of the BOM the sample starts with,
+    or `None`.
+    """
+    for name, bom in BOMS:
+        if sample.startswith(bom):
+            return name, bom
+    return None
+
+
+def detect_line_endings(text, cr, lf):
+    """Return ``'CRLF'``, ``'LF'``, ``'CR'``, ``'mixed'``, or `None` (if
+    there are no line breaks).
+    """
+    crlf_count = text.count(cr + lf)
+    counts = [
+        ('CRLF', crlf_count),
+        ('LF', text.count(lf) - crlf_count),
+        ('CR', text.count(cr) - crlf_count),
+    ]
+    found = [name for name, count in counts if count]
+    if len(found) > 1:
+        return 'mixed'
+    return found[0] if found else None
+
+
+def matches(signatures, kinds):
+    """Tell if any of the kinds of signatures were found."""
+    for kind in kinds:
+        if kind == 'bom' and signatures.bom is not None:
+            return True
+        elif kind == 'binary' and signatures.binary:
+            return True
+        elif kind == 'shebang' and signatures.shebang is not None:
+            return True
+        elif signatures.line_endings is not None and \
+                kind == signatures.line_endings.lower():
+            return True
+    return False
+
+
+def format_signatures(signatures):
+    descriptions = []
+    if signatures.bom is not None:
+        descriptions.append(signatures.bom + ' BOM')
+    if signatures.line_endings is not None:
+        descriptions.append(signatures.line_endings + ' line endings')
+    if signatures.binary:
+        descriptions.append('binary')
+    if signatures.shebang is not None:
+        descriptions.append('shebang: ' + signatures.shebang)
+    return ', '.join(descriptions) or 'nothing found'
+
+
+def inspect_file(filename, fix=False):
+    """Detect the signatures in the file's beginning.
+
+    If ``fix`` is set, a UTF-8 BOM is stripped from the file.  The rest of
+    the file is copied (in blocks) to a temporary file in the same
+    directory, which then replaces it.
+    """
+    with open(filename, 'rb') as f:
+        sample = f.read(SAMPLE_SIZE)
+        signatures = detect_signatures(sample)
+        if fix and signatures.bom == 'UTF-8':
+            strip_bom(filename, f, sample[len(b'\xef\xbb\xbf'):])
+    return signatures
+
+
+def strip_bom(filename, f, rest_of_sample):
+    """Replace the file with a copy of the data following the BOM (which
+    is the rest of the sample and what has not been read from the file
+    yet).
+    """
+    directory = os.path.dirname(filename) or os.curdir
+    fd, temporary_filename = tempfile.mkstemp(dir=directory,
+                                              prefix='.find_signatures-')
+    try:
+        with open(fd, 'wb') as temporary_file:
+            temporary_file.write(rest_of_sample)
+            for block in iter(partial(f.read, BLOCK_SIZE), b''):
+                temporary_file.write(block)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        shutil.copymode(filename, temporary_filename)
+        os.replace(temporary_filename, filename)
+    except BaseException:
+        os.remove(temporary_filename)
+        raise
+
+
+def scan_directory(directory, skip_vcs=False, fix=False):
+    """List the directory and inspect the regular files in it.
+
+    Return the name and the signatures of each file (or the `OSError`
+    raised when inspecting it), as well as the paths of the
+    subdirectories (not including symbolic links to directories).
+    """
+    results = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not (skip_vcs and entry.name in VCS_DIRECTORIES):
+                            subdirectories.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    results.append((entry.path, inspect_file(entry.path, fix)))
+                except OSError as e:
+                    results.append((entry.path, e))
+    except OSError as e:
+        results.append((directory, e))
+    return results, subdirectories
+
+
+def find_signatures(path, jobs=1, skip_vcs=False, fix=False):
+    """Yield the name and the signatures (or the `OSError` raised when
+    inspecting it) of each regular file along the path.
+
+    With multiple jobs, that many directories are scanned at the same
+    time, and files are yielded in no particular order.  Otherwise,
+    directories are traversed depth-first, and files are yielded in
+    alphabetical order within each directory.
+    """
+    scan = partial(scan_directory, skip_vcs=skip_vcs, fix=fix)
+    if jobs <= 1:
+        directories = [path]
+        while directories:
+            results, subdirectories = scan(directories.pop())
+            for result in results:
+                yield result
+            directories.extend(reversed(subdirectories))
+        return
+
+    executor = ThreadPoolExecutor(jobs)
+    try:
+        pending = {executor.submit(scan, path)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, subdirectories = future.result()
+                pending.update(executor.submit(scan, subdirectory)
+                               for subdirectory in subdirectories)
+                for result in results:
+                    yield result
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = ArgumentParser(
+        description='Find files by the signatures at their beginning.')
+
+    parser.add_argument(
+        'path',
+        metavar='PATH')
+
+    parser.add_argument(
+        '-f', '--find',
+        dest='kinds',
+        choices=KINDS,
+        action='append',
+        help='a kind of signature to list the files with; can be given '
+             'multiple times (default: bom)')
+
+    parser.add_argument(
+        '-v', '--verbose',
+        dest='verbose',
+        action='store_true',
+        help='list every file along with the signatures found')
+
+    parser.add_argument(
+        '-j', '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of threads to scan directories with (default: 1)')
+
+    parser.add_argument(
+        '--skip-vcs',
+        dest='skip_vcs',
+        action='store_true',
+        help='skip version control directories (%s)'
+             % ', '.join(sorted(VCS_DIRECTORIES)))
+
+    parser.add_argument(
+        '--fix',
+        dest='fix',
+        action='store_true',
+        help='strip UTF-8 BOMs from the files they are found in (other '
+             'BOMs are left alone, as they are needed to tell the '
+             'encoding)')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    kinds = args.kinds or ['bom']
+
+    failed = False
+    try:
+        for filename, signatures in find_signatures(
+                args.path, args.jobs, args.skip_vcs, args.fix):
+            if isinstance(signatures, OSError):
+                print(signatures, file=sys.stderr)
+                failed = True
+            elif args.verbose:
+                print(filename + ' ... ' + format_signatures(signatures))
+            elif matches(signatures, kinds):
+                print(filename)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Git Index
+=========
+
+List the files tracked in a Git repository by reading its index file
+(``.git/index``) directly, without running ``git`` or walking the working
+tree.
+
+Along with its path, the index records each file's size and modification
+time as of the last time Git looked at it.  These are not updated when a
+file is changed (until Git is run again, e.g. ``git status``), and Git only
+stores the lowest 32 bits of the size.
+
+The index is read one entry at a time, so entries can be processed before
+all of them have been read.
+
+Index format versions 2, 3, and 4 are supported, but split indexes are not.
+
+:Copyright: 2026 Jochen Kupperschmidt
+:Date: 18-Oct-2026
+:License: MIT
+"""
+
+from argparse import ArgumentParser
+from collections import namedtuple
+import os
+import stat
+import struct
+import sys
+
+
+IndexEntry = namedtuple('IndexEntry', ['path', 'mode', 'size', 'mtime_ns'])
+
+
+SIGNATURE = b'DIRC'
+HEADER = struct.Struct('>4sLL')
+
+# ctime (seconds, nanoseconds), mtime (seconds, nanoseconds), device,
+# inode, mode, user ID, group ID, size, object ID, flags
+ENTRY = struct.Struct('>LLLLLLLLLL20sH')
+EXTENDED_FLAGS = struct.Struct('>H')
+# name, size
+EXTENSION_HEADER = struct.Struct('>4sL')
+
+FLAG_EXTENDED = 0x4000
+FLAG_STAGE = 0x3000
+EXTENDED_FLAG_SKIP_WORKTREE = 0x4000
+
+# The length of the checksum at the end of the index file.
+CHECKSUM_SIZE = 20
+
+
+class GitIndexError(ValueError):
+    """The Git index could not be found or read."""
+
+
+def find_repository(path):
+    """Return the top-level directory of the working tree that contains
+    the path, along with the repository's Git directory.
+
+    Raise `ValueError` if the path is not inside a working tree.
+    """
+    directory = os.path.realpath(path)
+    while True:
+        dot_git = os.path.join(directory, '.git')
+        if os.path.isdir(dot_git):
+            return directory, dot_git
+        if os.path.isfile(dot_git):
+            # Linked working trees and submodules refer to their Git
+            # directory elsewhere.
+            with open(dot_git) as f:
+                line = f.readline().strip()
+            if line.startswith('gitdir:'):
+                git_dir = line[len('gitdir:'):].strip()
+                return directory, os.path.join(directory, git_dir)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise ValueError('Not inside a Git working tree: ' + path)
+        directory = parent
+
+
+def read_index(f):
+    """Read the entries from the index file, one at a time.
+
+    Paths are returned as bytes, relative to the top-level directory of
+    the working tree and separated by forward slashes.
+
+    Only the first stage of paths with merge conflicts is returned, and
+    entries excluded from the working tree by a sparse checkout are
+    skipped.
+
+    Raise `ValueError` if the file is not a valid index.  That a split
+    index is not supported may only be noticed after some of its entries
+    have been read, as the extension telling so follows them.
+    """
+    signature, version, entry_count = HEADER.unpack(
+        read_bytes(f, HEADER.size))
+    if signature != SIGNATURE:
+        raise ValueError('Not a Git index file: ' + f.name)
+    if version not in (2, 3, 4):
+        raise ValueError(
+            'Unsupported Git index version %d: %s' % (version, f.name))
+
+    path = b''
+    previous_path = None
+    for _ in range(entry_count):
+        (_, _, mtime, mtime_ns, _, _, mode, _, _, size, _,
+         flags) = ENTRY.unpack(read_bytes(f, ENTRY.size))
+        length = ENTRY.size
+        extended_flags = 0
+        if version >= 3 and flags & FLAG_EXTENDED:
+            extended_flags, = EXTENDED_FLAGS.unpack(
+                read_bytes(f, EXTENDED_FLAGS.size))
+            length += EXTENDED_FLAGS.size
+
+        if version == 4:
+            # The path replaces a number of bytes at the end of the
+            # previous path.
+            strip_count = read_offset(f)
+            path = path[:len(path) - strip_count] + read_path(f)
+        else:
+            # The entry is padded with one to eight NUL bytes (the first
+            # of which terminates the path).
+            path = read_path(f)
+            length += len(path) + 1
+            read_bytes(f, -length % 8)
+        if not path:
+            # Only split indexes leave paths to the shared index.
+            raise ValueError('Split Git indexes are not supported: ' +
+                             f.name)
+
+        if flags & FLAG_STAGE and path == previous_path:
+            continue
+        if extended_flags & EXTENDED_FLAG_SKIP_WORKTREE:
+            continue
+        previous_path = path
+        yield IndexEntry(path, mode, size, mtime * 1000000000 + mtime_ns)
+
+    for name in read_extension_names(f):
+        if name == b'link':
+            raise ValueError('Split Git indexes are not supported: ' +
+                             f.name)
+
+
+def read_bytes(f, size):
+    """Read exactly that many bytes from the index file."""
+    data = f.read(size)
+    if len(data) < size:
+        raise ValueError('Truncated Git index file: ' + f.name)
+    return data
+
+
+def read_path(f):
+    """Read the NUL-terminated path at the current position (without the
+    NUL).
+    """
+    parts = []
+    while True:
+        buffered = f.peek()
+        if not buffered:
+            raise ValueError('Truncated Git index file: ' + f.name)
+        end = buffered.find(b'\0')
+        if end >= 0:
+            parts.append(f.read(end + 1)[:-1])
+            return b''.join(parts)
+        parts.append(f.read(len(buffered)))
+
+
+def read_offset(f):
+    """Decode the variable-length integer at the current position."""
+    byte = read_bytes(f, 1)[0]
+    value = byte & 0x7f
+    while byte & 0x80:
+        byte = read_bytes(f, 1)[0]
+        value = ((value + 1) << 7) | (byte & 0x7f)
+    return value
+
+
+def read_extension_names(f):
+    """Yield the name of each extension following the entries (skipping
+    the extensions' data).
+    """
+    end = os.fstat(f.fileno()).st_size - CHECKSUM_SIZE
+    while f.tell() + EXTENSION_HEADER.size <= end:
+        name, size = EXTENSION_HEADER.unpack(
+            read_bytes(f, EXTENSION_HEADER.size))
+        f.seek(size, os.SEEK_CUR)
+        yield name
+
+
+def list_tracked_files(path):
+    """Yield the path (beneath the given path) and the index entry of each
+    regular file tracked in the Git repository that contains the path.
+
+    Symbolic links, submodules, and entries of directories in sparse
+    indexes are skipped.  Files are listed in the order of their paths'
+    bytes, as in the index.
+
+    Raise `GitIndexError` if the path is not inside a working tree or
+    the index cannot be read (which may happen after some files have
+    been listed).
+    """
+    try:
+        work_tree, git_dir = find_repository(path)
+        try:
+            f = open(os.path.join(git_dir, 'index'), 'rb')
+        except FileNotFoundError:
+            # Nothing has been added to the repository yet.
+            return
+
+        prefix = os.path.relpath(os.path.realpath(path), work_tree)
+        if prefix == os.curdir:
+            prefix = b''
+        else:
+            prefix = os.fsencode(prefix).replace(os.sep.encode(), b'/') + \
+                b'/'
+
+        with f:
+            for entry in read_index(f):
+                if not entry.path.startswith(prefix):
+                    continue
+                if not stat.S_ISREG(entry.mode):
+                    continue
+                relative_path = os.fsdecode(entry.path[len(prefix):])
+                if os.sep != '/':
+                    relative_path = relative_path.replace('/', os.sep)
+                yield os.path.join(path, relative_path), entry
+    except (OSError, ValueError) as e:
+        raise GitIndexError(e) from e
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = ArgumentParser(
+        description='List the files tracked in a Git repository along '
+                    'with their sizes as recorded in its index.')
+
+    parser.add_argument(
+        'path',
+        metavar='PATH',
+        nargs='?',
+        default=os.curdir)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        for path, entry in list_tracked_files(args.path):
+            print('%12d %s' % (entry.size, path))
+    except (OSError, ValueError) as e:
+        sys.exit(e)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,57 +22,894 @@ Example usage and output::
 
 It returns the total for each pattern and an overall total.
 
+Alternatively, lines can be classified as code, comment, or
+blank lines, which are then totalled for each language.
+
 Be aware that files will be included multiple times if you
 specify overlapping patterns and so the result might not be
-what you expected.
+what you expected.  (Each file is only read once, though.)
+
+Version control directories and files ignored by ``.gitignore``
+files can be skipped.  Alternatively, only the files tracked in a Git
+repository can be counted, as listed in its index (without walking the
+file system).
 
-Python 2.6 or later is required.
+Python 3.9 or later is required.
 
 :Copyright: 2005-2014 Jochen Kupperschmidt
 :Date: 10-Jul-2014 (original release: 29-Jan-2005)
 :License: MIT
 """
 
-from __future__ import print_function
 from argparse import ArgumentParser
-from glob import iglob
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import fnmatch
+from functools import partial
 import locale
 locale.setlocale(locale.LC_ALL, '')
 import os
+import re
+import signal
+import sqlite3
+import stat
+import sys
+
+import gitindex
+
+
+# The number of bytes to read at once when counting lines.
+BLOCK_SIZE = 1024 * 1024
+
+NEWLINE = ord('\n')
+
+VCS_DIRECTORIES = frozenset(['.bzr', '.git', '.hg', '.svn', 'CVS', '_darcs'])
+
+# When counting with multiple processes, small files are handed to them in
+# batches of up to this many files or bytes, and files bigger than this are
+# split into ranges of this size.
+BATCH_FILES = 100
+BATCH_SIZE = 16 * 1024 * 1024
+
+
+def count_lines(filename, block_size=BLOCK_SIZE):
+    """Count lines in file.
+
+    Large blocks are read into a single buffer, and the line breaks in
+    it are counted without splitting it into lines.  A last line without
+    a line break is counted, too.
+    """
+    line_count, last_byte = count_line_breaks(filename, 0, None, block_size)
+    if last_byte is not None and last_byte != NEWLINE:
+        line_count += 1
+    return line_count
+
+
+def count_line_breaks(filename, start=0, length=None, block_size=BLOCK_SIZE):
+    """Count the line breaks in (a range of) the file.
+
+    Return the count and the last byte that was read (or `None` if there
+    was none).
+    """
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    line_break_count = 0
+    last_byte = None
+    with open(filename, 'rb', buffering=0) as f:
+        f.seek(start)
+        while length is None or length > 0:
+            if length is None:
+                read_length = f.readinto(buffer)
+            else:
+                read_length = f.readinto(view[:min(length, block_size)])
+                length -= read_length
+            if not read_length:
+                break
+            line_break_count += buffer.count(b'\n', 0, read_length)
+            last_byte = buffer[read_length - 1]
+    return line_break_count, last_byte
+
+
+def count_lines_in_files(filenames, classify=False):
+    """Count lines in each of the files."""
+    return [count_file(filename, classify) for filename in filenames]
+
+
+def count_file(filename, classify=False):
+    """Count lines in file, or classify them (see `classify_lines`)."""
+    if classify:
+        return classify_lines(filename, get_language(filename))
+    return count_lines(filename)
+
+
+class LineCounts(namedtuple('LineCounts', ['code', 'comment', 'blank'])):
+    """The numbers of code, comment, and blank lines.
+
+    Adding two of them adds up each number.
+    """
+
+    __slots__ = ()
+
+    def __add__(self, other):
+        return LineCounts(*[a + b for a, b in zip(self, other)])
+
+    @property
+    def total(self):
+        return self.code + self.comment + self.blank
+
+
+# A language's comments (starting with one of the line comment tokens, or
+# enclosed in one of the pairs of block comment tokens) and strings (given
+# as tuples of the delimiter, whether they may span multiple lines, and
+# whether backslashes escape the next character).
+Language = namedtuple('Language', [
+    'name', 'extensions', 'line_comments', 'block_comments', 'strings'])
+
+C_STRINGS = [('"', False, True), ("'", False, True)]
+PYTHON_STRINGS = [('"""', True, True), ("'''", True, True)] + C_STRINGS
+C_COMMENTS = {'line_comments': ['//'], 'block_comments': [('/*', '*/')]}
+
+LANGUAGES = [
+    Language('C', ['.c', '.h'], strings=C_STRINGS, **C_COMMENTS),
+    Language('C#', ['.cs'], strings=C_STRINGS, **C_COMMENTS),
+    Language('C++', ['.cc', '.cpp', '.cxx', '.hh', '.hpp', '.hxx'],
+             strings=C_STRINGS, **C_COMMENTS),
+    Language('CSS', ['.css'], [], [('/*', '*/')], C_STRINGS),
+    Language('Go', ['.go'], strings=C_STRINGS + [('`', True, False)],
+             **C_COMMENTS),
+    Language('Haskell', ['.hs'], ['--'], [('{-', '-}')], [('"', False, True)]),
+    Language('HTML', ['.htm', '.html', '.xhtml'], [], [('<!--', '-->')], []),
+    Language('INI', ['.cfg', '.ini'], [';', '#'], [], []),
+    Language('Java', ['.java'], strings=C_STRINGS, **C_COMMENTS),
+    Language('JavaScript', ['.js', '.jsx', '.mjs', '.ts', '.tsx'],
+             strings=C_STRINGS + [('`', True, True)], **C_COMMENTS),
+    Language('Lua', ['.lua'], ['--'], [('--[[', ']]')], C_STRINGS),
+    Language('Perl', ['.pl', '.pm'], ['#'], [], C_STRINGS),
+    Language('PHP', ['.php'], ['//', '#'], [('/*', '*/')], C_STRINGS),
+    Language('Python', ['.py', '.pyw'], ['#'], [], PYTHON_STRINGS),
+    Language('Ruby', ['.rb'], ['#'], [], C_STRINGS),
+    Language('Rust', ['.rs'], strings=[('"', True, True)], **C_COMMENTS),
+    Language('Shell', ['.bash', '.sh', '.zsh'], ['#'], [], C_STRINGS),
+    Language('SQL', ['.sql'], ['--'], [('/*', '*/')], [("'", False, True)]),
+    Language('XML', ['.svg', '.xml', '.xsd', '.xsl'], [], [('<!--', '-->')],
+             []),
+    Language('YAML', ['.yaml', '.yml'], ['#'], [], []),
+]
+
+# Files in other languages (or of other types) only have code and blank
+# lines.
+OTHER_LANGUAGE = Language('other', [], [], [], [])
+
+LANGUAGES_BY_EXTENSION = {
+    extension: language
+    for language in LANGUAGES
+    for extension in language.extensions}
+
+
+def get_language(filename):
+    """Determine the file's language by its extension."""
+    extension = os.path.splitext(filename)[1].lower()
+    return LANGUAGES_BY_EXTENSION.get(extension, OTHER_LANGUAGE)
+
+
+def classify_lines(filename, language, block_size=BLOCK_SIZE):
+    """Count code, comment, and blank lines in file.
+
+    Lines with code (including strings) are code lines, lines with only
+    comments are comment lines, and lines with nothing but whitespace
+    (even inside a block comment) are blank lines.
+    """
+    classifier = LineClassifier(language)
+    with open(filename, 'rb', buffering=0) as f:
+        for block in iter(partial(f.read, block_size), b''):
+            classifier.feed(block)
+    return classifier.close()
+
+
+NON_SPACE = re.compile(br'\S')
+BLANK_LINE = re.compile(br'^[ \t\r\f\v]*\n', re.MULTILINE)
+
+
+class LineClassifier(object):
+    """A state machine that classifies lines as they are fed to it, in
+    blocks of arbitrary size.
+
+    It only stops at tokens that may change its state (i.e. the start
+    and end of comments and strings).  All lines in between are
+    classified at once, by counting line breaks and blank lines.
+    """
+
+    def __init__(self, language):
+        self.states, self.token_length = self._compile(language)
+        self.state = self.states['normal']
+        self.counts = [0, 0, 0]  # code, comment, blank
+        self.has_code = False
+        self.has_comment = False
+        self.pending = b''
+        self.last_byte = b''
+
+    @staticmethod
+    def _compile(language):
+        """Build the states (each a triple of whether its contents are
+        comments, a pattern matching the tokens ending it, and a mapping
+        of those tokens to their names), and return them along with the
+        length of the longest token.
+
+        The patterns are plain alternations of literals (without groups)
+        so that the regular expression engine can skip ahead quickly to
+        the next token.  Tokens not found in the mapping are escapes.
+        """
+        def _state(is_comment, tokens, escapes=False):
+            names = {}
+            for token, name in tokens:
+                names.setdefault(token.encode(), name)
+            alternatives = [re.escape(token) for token
+                            in sorted(names, key=len, reverse=True)]
+            if escapes:
+                alternatives.insert(0, br'\\[^\n]')
+            pattern = b'|'.join(alternatives) if alternatives else b'(?!)'
+            return is_comment, re.compile(pattern), names
+
+        states = {
+            'normal': _state(False,
+                [(token, 'line%d' % i) for i, token
+                 in enumerate(language.line_comments)] +
+                [(start, 'block%d' % i) for i, (start, end)
+                 in enumerate(language.block_comments)] +
+                [(delimiter, 'string%d' % i) for i, (delimiter, _, _)
+                 in enumerate(language.strings)]),
+            'line': _state(True, [('\n', 'newline')]),
+        }
+        for i, (start, end) in enumerate(language.block_comments):
+            states['block%d' % i] = _state(True, [(end, 'close')])
+        for i, (delimiter, multiline, escapes) in enumerate(language.strings):
+            tokens = [(delimiter, 'close')]
+            if not multiline:
+                tokens.append(('\n', 'newline'))
+            states['string%d' % i] = _state(False, tokens, escapes)
+
+        # Escapes are two bytes long.
+        token_length = max([2] + [len(token) for _, _, names
+                                  in states.values() for token in names])
+        return states, token_length
+
+    def feed(self, data):
+        """Classify the data, except for the last few bytes, which might
+        be the beginning of a token that is completed by more data.
+        """
+        if not data:
+            return
+        self.last_byte = data[-1:]
+        data = self.pending + data
+        stop = self._scan(data, len(data) - self.token_length + 1)
+        self.pending = data[stop:]
+
+    def close(self):
+        """Classify the rest of the data, including the last line (if not
+        terminated by a line break), and return the numbers of code,
+        comment, and blank lines.
+        """
+        self._scan(self.pending, len(self.pending))
+        self.pending = b''
+        if self.last_byte not in (b'', b'\n'):
+            self._end_line()
+        self.last_byte = b''
+        return LineCounts(*self.counts)
+
+    def _scan(self, data, cut):
+        """Classify the data up to where it is cut (or to the end of a
+        token beginning before that), and return that position.
+        """
+        pos = 0
+        while True:
+            is_comment, tokens, names = self.state
+            match = tokens.search(data, pos)
+            if match is None or match.start() >= cut:
+                stop = max(pos, cut)
+                self._consume(data, pos, stop, is_comment)
+                return stop
+            self._consume(data, pos, match.start(), is_comment)
+            pos = self._handle_token(match, names)
+
+    def _handle_token(self, match, names):
+        """Switch states according to the token, and return the position
+        to continue at.
+        """
+        token = names.get(match.group(), 'escape')
+        if token == 'newline':
+            # Leave the line break to the normal state.
+            self.state = self.states['normal']
+            return match.start()
+        elif token == 'escape':
+            self.has_code = True
+        elif token == 'close':
+            if self.state[0]:
+                self.has_comment = True
+            else:
+                self.has_code = True
+            self.state = self.states['normal']
+        elif token.startswith('string'):
+            self.has_code = True
+            self.state = self.states[token]
+        elif token.startswith('line'):
+            # All line comments end the same way.
+            self.has_comment = True
+            self.state = self.states['line']
+        else:
+            self.has_comment = True
+            self.state = self.states[token]
+        return match.end()
+
+    def _consume(self, data, start, end, is_comment):
+        """Classify the lines in the data between two tokens."""
+        if start == end:
+            return
+        first = data.find(b'\n', start, end)
+        if first < 0:
+            self._mark(data, start, end, is_comment)
+            return
+
+        # The line that was started before
+        self._mark(data, start, first, is_comment)
+        self._end_line()
+
+        # Complete lines
+        last = data.rfind(b'\n', first, end)
+        if last > first:
+            line_count = data.count(b'\n', first + 1, last + 1)
+            blank_count = len(BLANK_LINE.findall(data, first + 1, last + 1))
+            self.counts[1 if is_comment else 0] += line_count - blank_count
+            self.counts[2] += blank_count
+
+        # The line that is started
+        self._mark(data, last + 1, end, is_comment)
+
+    def _mark(self, data, start, end, is_comment):
+        if is_comment:
+            if not self.has_comment and NON_SPACE.search(data, start, end):
+                self.has_comment = True
+        elif not self.has_code and NON_SPACE.search(data, start, end):
+            self.has_code = True
+
+    def _end_line(self):
+        if self.has_code:
+            self.counts[0] += 1
+        elif self.has_comment:
+            self.counts[1] += 1
+        else:
+            self.counts[2] += 1
+        self.has_code = False
+        self.has_comment = False
+
+
+def walk(top, skip_vcs=False, use_gitignore=False):
+    """Walk file system tree and yield each directory's name along
+    with the entries (as `os.DirEntry` objects) of the non-directories
+    in it.
+
+    Each directory is listed once.  Symbolic links to directories are
+    not followed.  Directories (with everything beneath them) and files
+    can be skipped if they belong to a version control system or are
+    ignored by ``.gitignore`` files (which implies skipping the ``.git``
+    directory).
+    """
+    skipped_directories = set()
+    if skip_vcs:
+        skipped_directories.update(VCS_DIRECTORIES)
+    if use_gitignore:
+        skipped_directories.add('.git')
+
+    # Each directory comes with its path relative to the top directory
+    # (using forward slashes and ending with one, if not empty) and the
+    # ignore rules that apply to it.
+    directories = [(top, '', [])]
+    while directories:
+        directory, relative_path, rules = directories.pop()
+        if use_gitignore:
+            directory_rules = read_gitignore(directory)
+            if directory_rules:
+                rules = rules + [(relative_path, directory_rules)]
+
+        files = []
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir and entry.name in skipped_directories:
+                        continue
+                    entry_path = relative_path + entry.name
+                    if rules and is_ignored(rules, entry_path, is_dir):
+                        continue
+                    if is_dir:
+                        subdirectories.append(
+                            (entry.path, entry_path + '/', rules))
+                    else:
+                        files.append(entry)
+        except OSError:
+            pass
+
+        yield directory, files
+        directories.extend(reversed(subdirectories))
+
+
+def read_gitignore(directory):
+    """Read the ignore rules from the directory's ``.gitignore`` file.
+
+    Return a list of the rules as tuples of a compiled pattern (matching
+    paths relative to the directory), whether the rule is negated, and
+    whether it only applies to directories.
+    """
+    try:
+        with open(os.path.join(directory, '.gitignore'), 'rb') as f:
+            lines = f.read().decode('utf-8', 'surrogateescape').splitlines()
+    except OSError:
+        return []
+
+    rules = []
+    for line in lines:
+        line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            continue
+
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\'):
+            line = line[1:]
+
+        directories_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+
+        # Patterns with a slash (except at the end) are relative to the
+        # directory, others apply to names at any level beneath it.
+        anchored = '/' in line
+        regex = translate_gitignore_pattern(line.lstrip('/'))
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        rules.append((re.compile(regex + r'\Z', re.DOTALL), negated,
+                      directories_only))
+    return rules
+
+
+def translate_gitignore_pattern(pattern):
+    """Translate a ``.gitignore`` pattern to a regular expression."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i) and i + 2 == len(pattern):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append('[' + chars.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+def is_ignored(rules, path, is_dir):
+    """Tell if the path (relative to the top directory) is ignored.
 
+    ``rules`` is a list of pairs of the relative path of a directory and
+    the ignore rules from its ``.gitignore`` file, from the top down.
+    Rules from deeper directories and, in the same file, later rules
+    take precedence.
+    """
+    for directory_path, directory_rules in reversed(rules):
+        relative_path = path[len(directory_path):]
+        for regex, negated, directories_only in reversed(directory_rules):
+            if directories_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                return not negated
+    return False
 
-def count_lines(filename):
-    """Count lines in file."""
-    with open(filename, 'rb') as f:
-        return sum(1 for line in f)
 
+def compile_patterns(patterns):
+    """Return a function that returns the patterns a file name matches.
 
-def walk(top):
-    """Walk file system tree and return directory names."""
-    yield top
-    for name in os.listdir(top):
-        name = os.path.join(top, name)
-        if os.path.isdir(name) and not os.path.islink(name):
-            for directory in walk(name):
-                yield directory
+    Like `glob`, names that start with a dot are only matched by
+    patterns that start with a dot, too.  Names are tested against all
+    patterns at once, and only those that match any of them are tested
+    against each pattern.
+    """
+    def _compile(patterns):
+        compiled = [
+            (pattern, re.compile(fnmatch.translate(os.path.normcase(pattern))))
+            for pattern in patterns]
+        combined = re.compile('|'.join(
+            '(?:%s)' % regex.pattern for pattern, regex in compiled))
+        return combined, compiled
 
+    visible = _compile(patterns)
+    hidden = _compile([p for p in patterns if p.startswith('.')])
 
-def match_filenames(path, patterns, callback):
-    """Find files matching the pattern and count their lines."""
-    for directory in walk(path):
-        for pattern in patterns:
-            for filename in iglob(os.path.join(directory, pattern)):
-                line_count = count_lines(filename)
-                callback(filename, line_count)
-                yield pattern, line_count
+    def match(name):
+        name = os.path.normcase(name)
+        combined, compiled = hidden if name.startswith('.') else visible
+        if not compiled or not combined.match(name):
+            return []
+        return [pattern for pattern, regex in compiled if regex.match(name)]
 
+    return match
+
+
+class TrackedFile(object):
+    """A file listed in a Git index, in place of an `os.DirEntry`.
+
+    The result of the `stat()` call is cached, too.
+    """
+
+    __slots__ = ('path', 'name', '_stat')
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_file(self):
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+def find_files(path, patterns, skip_vcs=False, use_gitignore=False,
+               tracked=False):
+    """Find files matching the patterns.
+
+    Yield the entry of each file along with the patterns it matches.
+
+    If ``tracked`` is set, the files are those tracked in the Git
+    repository containing the path (and beneath it), as listed in its
+    index.  Files that do not exist (anymore) are skipped.
+    """
+    match = compile_patterns(patterns)
+    if tracked:
+        for file_path, _ in gitindex.list_tracked_files(path):
+            matching_patterns = match(os.path.basename(file_path))
+            if matching_patterns:
+                entry = TrackedFile(file_path)
+                if entry.is_file():
+                    yield entry, matching_patterns
+        return
+
+    for directory, entries in walk(path, skip_vcs, use_gitignore):
+        for entry in entries:
+            matching_patterns = match(entry.name)
+            if matching_patterns and entry.is_file():
+                yield entry, matching_patterns
+
+
+def count_lines_concurrently(files, jobs, cache=None, classify=False):
+    """Count the lines of the files (given as pairs of entry and
+    something to pass along) in a pool of ``jobs`` worker processes.
+
+    Yield each file's entry, the value passed along with it, its line
+    count, and whether it was counted (rather than found in the cache),
+    in the original order.
+
+    Line counts found in the cache (if given) are not counted again.
+    Files whose lines are classified are not split up.
+    """
+    executor = ProcessPoolExecutor(jobs, initializer=ignore_interrupts)
+    # The work units submitted so far, in order, each being a list of
+    # (entry, value, function returning the line count, whether it is
+    # counted) tuples.
+    units = deque()
+    batch = []
+
+    def _submit_batch():
+        future = executor.submit(
+            count_lines_in_files, [entry.path for entry, _, _ in batch],
+            classify)
+        units.append([
+            (entry, value, partial(get_batch_result, future, i), True)
+            for i, (entry, value, _) in enumerate(batch)])
+        del batch[:]
+
+    try:
+        for entry, value in files:
+            line_count = None
+            if cache is not None:
+                line_count = cache.get(entry, classify)
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                size = 0
+
+            if line_count is not None:
+                if batch:
+                    _submit_batch()
+                units.append([
+                    (entry, value, lambda count=line_count: count, False)])
+            elif size > BATCH_SIZE and not classify:
+                if batch:
+                    _submit_batch()
+                futures = [
+                    executor.submit(count_line_breaks, entry.path, start,
+                                    BATCH_SIZE)
+                    for start in range(0, size, BATCH_SIZE)]
+                units.append(
+                    [(entry, value, partial(get_ranges_result, futures),
+                      True)])
+            else:
+                batch.append((entry, value, size))
+                if len(batch) >= BATCH_FILES or \
+                        sum(size for _, _, size in batch) >= BATCH_SIZE:
+                    _submit_batch()
+
+            while len(units) > jobs * 4:
+                for entry, value, get_result, counted in units.popleft():
+                    yield entry, value, get_result(), counted
+
+        if batch:
+            _submit_batch()
+        while units:
+            for entry, value, get_result, counted in units.popleft():
+                yield entry, value, get_result(), counted
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def get_batch_result(future, index):
+    """Return the line count of a file counted as part of a batch."""
+    return future.result()[index]
+
+
+def get_ranges_result(futures):
+    """Return the line count of a file whose line breaks were counted
+    range by range.
+    """
+    line_count = 0
+    last_byte = None
+    for future in futures:
+        line_break_count, range_last_byte = future.result()
+        line_count += line_break_count
+        if range_last_byte is not None:
+            last_byte = range_last_byte
+    if last_byte is not None and last_byte != NEWLINE:
+        line_count += 1
+    return line_count
+
+
+def ignore_interrupts():
+    """Leave handling Ctrl-C to the main process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class LineCountCache(object):
+    """A persistent cache of line counts.
+
+    Line counts are stored per path, along with the size, modification
+    time, and inode of the file at the time it was counted.  If any of
+    them changed since, the file is counted again.
+
+    Entries for files that have not been looked up since the cache was
+    opened are removed when it is closed.
+
+    Nothing is written for valid entries that are looked up, except
+    their paths to a temporary table (to tell which entries to keep).
+    Those paths and new line counts are written in batches, and only
+    committed when the cache is closed.
+    """
+
+    # The number of paths of valid entries and of line counts to collect
+    # before writing them at once
+    WRITE_BATCH_SIZE = 1000
+
+    SCHEMA_VERSION = 2
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS line_counts (
+            path BLOB PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            line_count INTEGER NOT NULL,
+            code INTEGER,
+            comment INTEGER,
+            blank INTEGER,
+            run INTEGER NOT NULL
+        );
+    """
+
+    # Classified counts of files that did not change are kept when a plain
+    # line count is stored.
+    PUT = """
+        INSERT INTO line_counts
+            (path, size, mtime_ns, inode, line_count, code, comment, blank,
+             run)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            code = CASE
+                WHEN excluded.code IS NOT NULL THEN excluded.code
+                WHEN (size, mtime_ns, inode) = (excluded.size,
+                    excluded.mtime_ns, excluded.inode) THEN code END,
+            comment = CASE
+                WHEN excluded.code IS NOT NULL THEN excluded.comment
+                WHEN (size, mtime_ns, inode) = (excluded.size,
+                    excluded.mtime_ns, excluded.inode) THEN comment END,
+            blank = CASE
+                WHEN excluded.code IS NOT NULL THEN excluded.blank
+                WHEN (size, mtime_ns, inode) = (excluded.size,
+                    excluded.mtime_ns, excluded.inode) THEN blank END,
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            inode = excluded.inode,
+            line_count = excluded.line_count,
+            run = excluded.run
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        version, = self.connection.execute('PRAGMA user_version').fetchone()
+        if version != self.SCHEMA_VERSION:
+            self.connection.execute('DROP TABLE IF EXISTS line_counts')
+            self.connection.execute(
+                'PRAGMA user_version = %d' % self.SCHEMA_VERSION)
+        self.connection.executescript(self.SCHEMA)
+        self.run, = self.connection.execute(
+            'SELECT COALESCE(MAX(run), 0) + 1 FROM line_counts').fetchone()
+        self.connection.execute(
+            'CREATE TEMP TABLE looked_up (path BLOB PRIMARY KEY)')
+        self.looked_up = []
+        self.line_counts = []
+
+    def get(self, entry, classify=False):
+        """Return the line count (or the `LineCounts`, if classified) for
+        the file (given as directory entry) if it is still valid, or
+        `None`.
+        """
+        try:
+            stat = entry.stat()
+        except OSError:
+            return None
+        path = os.fsencode(entry.path)
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, inode, line_count, code, comment, blank '
+            'FROM line_counts WHERE path = ?', (path,)).fetchone()
+        if row is None or tuple(row[:3]) != (
+                stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return None
+        if classify and row[4] is None:
+            return None
+        self.looked_up.append((path,))
+        if len(self.looked_up) >= self.WRITE_BATCH_SIZE:
+            self._write()
+        return LineCounts(*row[4:]) if classify else row[3]
+
+    def put(self, entry, line_count):
+        """Store the line count (or the `LineCounts`) for the file (given
+        as directory entry).
+
+        Classified counts stored before are kept when storing a plain line
+        count, unless the file changed since.
+        """
+        try:
+            stat = entry.stat()
+        except OSError:
+            return
+        if isinstance(line_count, LineCounts):
+            line_count, counts = line_count.total, line_count
+        else:
+            counts = (None, None, None)
+        self.line_counts.append(
+            (os.fsencode(entry.path), stat.st_size, stat.st_mtime_ns,
+             stat.st_ino, line_count) + tuple(counts) + (self.run,))
+        if len(self.line_counts) >= self.WRITE_BATCH_SIZE:
+            self._write()
+
+    def _write(self):
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO looked_up (path) VALUES (?)',
+            self.looked_up)
+        self.connection.executemany(self.PUT, self.line_counts)
+        del self.looked_up[:]
+        del self.line_counts[:]
+
+    def close(self):
+        """Remove the entries for files that were not looked up, and save
+        the cache (compacting it if a lot of entries were removed).
+        """
+        with self.connection:
+            self._write()
+            removed = self.connection.execute(
+                'DELETE FROM line_counts WHERE run != ? AND path NOT IN ('
+                '  SELECT path FROM looked_up)', (self.run,)).rowcount
+            remaining, = self.connection.execute(
+                'SELECT COUNT(*) FROM line_counts').fetchone()
+        if removed > remaining:
+            self.connection.execute('VACUUM')
+        self.connection.close()
+
+
+def match_filenames(path, patterns, callback, skip_vcs=False,
+                    use_gitignore=False, jobs=1, cache=None, classify=False,
+                    tracked=False):
+    """Find files matching the patterns and count (or classify) their
+    lines.
+
+    Yield the entry of each file, the patterns it matches, and its line
+    count (or `LineCounts`).
+
+    If a `LineCountCache` is given, files are only counted if their line
+    count is not in it.
+    """
+    def _count_lines(entry):
+        if cache is not None:
+            line_count = cache.get(entry, classify)
+            if line_count is not None:
+                return line_count, False
+        return count_file(entry.path, classify), True
+
+    files = find_files(path, patterns, skip_vcs, use_gitignore, tracked)
+    if jobs > 1:
+        results = count_lines_concurrently(files, jobs, cache, classify)
+    else:
+        results = ((entry, matching_patterns) + _count_lines(entry)
+                   for entry, matching_patterns in files)
+
+    for entry, matching_patterns, line_count, counted in results:
+        if counted and cache is not None:
+            cache.put(entry, line_count)
+        callback(entry.path, line_count)
+        yield entry, matching_patterns, line_count
+
+
+def process_files(path, patterns, callback, skip_vcs=False,
+                  use_gitignore=False, jobs=1, cache=None, classify=False,
+                  tracked=False):
+    """Collect line count statistics.
+
+    Lines are totalled for each pattern (files matching multiple
+    patterns are included in each of their totals) or, if classified,
+    for each language.
+    """
+    if classify:
+        stats = {}
+        for entry, _, counts in match_filenames(
+                path, patterns, callback, skip_vcs, use_gitignore, jobs,
+                cache, classify, tracked):
+            language = get_language(entry.name).name
+            stats[language] = stats.get(language, LineCounts(0, 0, 0)) + \
+                counts
+        return stats
 
-def process_files(path, patterns, callback):
-    """Collect line count statistics."""
     stats = dict.fromkeys(patterns, 0)
-    for pattern, line_count in match_filenames(
-            path, patterns, callback):
-        stats[pattern] += line_count
+    for entry, matching_patterns, line_count in match_filenames(
+            path, patterns, callback, skip_vcs, use_gitignore, jobs, cache,
+            tracked=tracked):
+        for pattern in matching_patterns:
+            stats[pattern] += line_count
     return stats
 
 
@@ -82,6 +919,11 @@ def format_thousands(number):
 
 
 def assemble_summary(stats):
+    if any(isinstance(value, LineCounts) for value in stats.values()):
+        for line in assemble_classified_summary(stats):
+            yield line
+        return
+
     total = format_thousands(sum(stats.values()))
     key_width = max(len(k) for k in list(stats.keys()) + ['total'])
     value_width = len(total)
@@ -93,6 +935,25 @@ def assemble_summary(stats):
     yield total_line
 
 
+def assemble_classified_summary(stats):
+    total = sum(stats.values(), LineCounts(0, 0, 0))
+    header = ('', 'code', 'comment', 'blank', 'total')
+    rows = [
+        [key + ':'] + [format_thousands(number)
+                       for number in tuple(counts) + (counts.total,)]
+        for key, counts in sorted(stats.items()) + [('total', total)]]
+    widths = [max(len(row[i]) for row in rows + [header])
+              for i in range(len(header))]
+    template = '  '.join(['%%-%ds' % widths[0]] +
+                         ['%%%ds' % width for width in widths[1:]])
+    yield template % header
+    for row in rows[:-1]:
+        yield template % tuple(row)
+    total_line = template % tuple(rows[-1])
+    yield '-' * len(total_line)
+    yield total_line
+
+
 def parse_args():
     """Parse command line arguments."""
     parser = ArgumentParser(description='Count lines.')
@@ -124,6 +985,51 @@ def parse_args():
         action='store_true',
         help='show relative paths in details')
 
+    parser.add_argument(
+        '-c', '--classify',
+        dest='classify',
+        action='store_true',
+        help='count code, comment, and blank lines per language '
+             'instead of lines per pattern (this takes much longer, as '
+             'comments and strings are tracked in Python rather than just '
+             'counting line breaks; expect a few dozen times the time '
+             'for source code)')
+
+    parser.add_argument(
+        '--skip-vcs',
+        dest='skip_vcs',
+        action='store_true',
+        help='skip version control directories (%s)'
+             % ', '.join(sorted(VCS_DIRECTORIES)))
+
+    parser.add_argument(
+        '--gitignore',
+        dest='use_gitignore',
+        action='store_true',
+        help='skip files and directories ignored by `.gitignore` files')
+
+    parser.add_argument(
+        '-t', '--tracked',
+        dest='tracked',
+        action='store_true',
+        help='only count files tracked by Git, as listed in the '
+             'repository\'s index (instead of walking the file system)')
+
+    parser.add_argument(
+        '-j', '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of processes to count lines with (default: 1)')
+
+    parser.add_argument(
+        '--cache',
+        dest='cache',
+        metavar='FILE',
+        help='keep line counts in a cache file (created if not existing) '
+             'and only count files that changed since; entries for files '
+             'that were not counted are removed')
+
     return parser.parse_args()
 
 
@@ -137,9 +1043,23 @@ def main():
                 filename = os.path.abspath(filename)
             elif args.relative:
                 filename = '.' + filename[path_len:]
-            print('%5d %s' % (line_count, filename))
+            if isinstance(line_count, LineCounts):
+                print('%5d %5d %5d %5d %s' % (
+                    (line_count.total,) + tuple(line_count) + (filename,)))
+            else:
+                print('%5d %s' % (line_count, filename))
 
-    stats = process_files(args.path, args.patterns, callback)
+    cache = LineCountCache(args.cache) if args.cache else None
+    try:
+        stats = process_files(args.path, args.patterns, callback,
+                              args.skip_vcs, args.use_gitignore, args.jobs,
+                              cache, args.classify, args.tracked)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except (OSError, ValueError) as e:
+        sys.exit(e)
+    if cache is not None:
+        cache.close()
 
     print()
     for line in assemble_summary(stats):
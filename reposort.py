@@ -9,18 +9,39 @@ Recursively search files in a directory for ``$Id ... $`` identifier strings
 and show a list of matching files, ordered by the date of their latest change
 (according to the identifier).
 
-Supports Subversion (SVN), CVS, and RCS.
+Supports Subversion (SVN), CVS, and RCS.  Files without an ``$Id$`` keyword
+can also be identified by separate ``$Date$``, ``$Revision$``, and
+``$Author$`` keywords.
+
+Only the first few kilobytes of each file are read, and files that look
+binary (containing NUL bytes) are skipped.
+
+The identifiers can be kept in an index, so that only files that changed
+are scanned again.  The index can also be kept up to date continuously,
+showing the files again whenever their identifiers change.
 
 :Copyright: 2006 Jochen Kupperschmidt
 :Date: 12-May-2006
 :License: MIT
 """
 
-from __future__ import with_statement
+from calendar import timegm
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+import ctypes.util
+from datetime import datetime, timezone
+import errno
+from heapq import nlargest
 from itertools import islice
 from optparse import OptionParser
 import os
 import re
+import select
+import sqlite3
+import struct
+import sys
+import time
 
 
 # Configuration
@@ -29,31 +50,66 @@ BINARY_SUFFIXES = set((
     'class', 'pyc',
     'bz2', 'gz', 'rar', 'tar', 'zip'))  # ...
 
+# The number of bytes read from the start of each file.  Identifiers are
+# only looked for in there.
+PREFIX_SIZE = 8 * 1024
+
+# The number of files each thread scans at once.
+BATCH_FILES = 100
+
 
-RE_SVN_ID = re.compile('''
-    .*
-    \$Id:                           # Id string prefix
-    \ (?P<filename>.+)              # filename
+# The parsers are matched right at the start of the keyword.  Fields are
+# kept from running past the end of the keyword (or line), so a failing
+# match gives up quickly.
+
+RE_SVN_ID = re.compile(br'''
+    \$Id:\                          # Id string prefix
+    (?P<filename>[^$\n]+?)          # filename
     \ (?P<version>\d+)              # file revision
     \ (?P<date>\d{4}-\d{2}-\d{2})   # last change's date
     \ (?P<time>\d{2}:\d{2}:\d{2})Z  # last change's time
-    \ (?P<author>.+)                # last change's author's name
+    \ (?P<author>[^$\n]+?)          # last change's author's name
     \ \$                            # Id string suffix
-    .*
     ''', re.VERBOSE)
 
-RE_RCS_ID = re.compile('''
-    .*
-    \$Id:                           # Id string prefix
-    \ (?P<filename>.+),v            # filename
-    \ (?P<version>\d+.\d+)          # file version
-    \ (?P<date>\d{4}/\d{2}/\d{2})   # last change's date
+RE_RCS_ID = re.compile(br'''
+    \$Id:\                          # Id string prefix
+    (?P<filename>[^$\n]+?),v        # filename
+    \ (?P<version>\d+(?:\.\d+)+)    # file version
+    \ (?P<date>\d{4}[-/]\d{2}[-/]\d{2})  # last change's date
     \ (?P<time>\d{2}:\d{2}:\d{2})   # last change's time
-    \ (?P<author>.+)                # last change's author's name
-    \ Exp\ \$                       # Id string suffix
-    .*
+    \ (?P<author>[^$\n\ ]+)         # last change's author's name
+    \ \w+                           # state (usually ``Exp``)
+    (?:\ [^$\n]*)?                  # locker
+    \ \$                            # Id string suffix
+    ''', re.VERBOSE)
+
+# Separate ``$Date$``, ``$Revision$``, and ``$Author$`` keywords (as well
+# as their Subversion aliases) stand in for a missing ``$Id$``.
+RE_KEYWORD = re.compile(br'''
+    \$(?P<keyword>[A-Za-z]+):\      # keyword
+    (?P<value>[^$\n]*?)             # value
+    \ \$                            # keyword suffix
     ''', re.VERBOSE)
 
+KEYWORDS = {
+    b'Date': 'date',
+    b'LastChangedDate': 'date',
+    b'Revision': 'version',
+    b'Rev': 'version',
+    b'LastChangedRevision': 'version',
+    b'Author': 'author',
+    b'LastChangedBy': 'author',
+}
+
+# Subversion: ``2006-05-12 10:11:12 +0200 (Fri, 12 May 2006)``
+RE_SVN_DATE = re.compile(
+    br'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} [+-]\d{4})(?: \(.*\))?$')
+
+# RCS and CVS: ``2006/05/12 10:11:12``
+RE_RCS_DATE = re.compile(
+    br'(?P<date>\d{4}[-/]\d{2}[-/]\d{2}) (?P<time>\d{2}:\d{2}:\d{2})$')
+
 TYPES = {
     'svn': ('.svn', RE_SVN_ID),
     'cvs': ('CVS', RE_RCS_ID),
@@ -69,57 +125,534 @@ def autodetect_type(directory):
             return type_
 
 
-def find_id_line(f, max_lines):
-    """Try to find a line containing the id keyword ``$Id$``."""
-    for line in islice(f, max_lines):
-        if '$Id' in line:
-            return line
-
-
-class Id(object):
-    """An identifier."""
+def read_prefix(filename, size=PREFIX_SIZE):
+    """Read the beginning of the file.
+
+    Return `None` if it looks like a binary file (i.e. contains a NUL
+    byte).
+    """
+    with open(filename, 'rb') as f:
+        prefix = f.read(size)
+    if b'\0' in prefix:
+        return None
+    return prefix
+
+
+def find_id(prefix, type_, max_lines, filename):
+    """Find an identifier in the first lines of the file's beginning.
+
+    Prefer an ``$Id$`` keyword.  Otherwise, put one together from
+    ``$Date$`` (which is required), ``$Revision$``, and ``$Author$``
+    keywords.
+    """
+    # Limit the search to the first lines.
+    end = 0
+    for _ in range(max_lines):
+        newline = prefix.find(b'\n', end)
+        if newline < 0:
+            end = len(prefix)
+            break
+        end = newline + 1
+
+    regex = TYPES[type_][1]
+    pos = prefix.find(b'$Id:', 0, end)
+    while pos >= 0:
+        m = regex.match(prefix, pos, end)
+        if m is not None:
+            return Id.create(**decode_fields(m.groupdict()))
+        pos = prefix.find(b'$Id:', pos + 1, end)
+
+    return parse_keywords(prefix, end, filename)
+
+
+def parse_keywords(prefix, end, filename):
+    """Put an identifier together from separate keywords."""
+    fields = {}
+    pos = prefix.find(b'$', 0, end)
+    while pos >= 0:
+        m = RE_KEYWORD.match(prefix, pos, end)
+        if m is None:
+            pos = prefix.find(b'$', pos + 1, end)
+            continue
+        field = KEYWORDS.get(m.group('keyword'))
+        if field is not None:
+            fields.setdefault(field, m.group('value'))
+        pos = prefix.find(b'$', m.end(), end)
+
+    if 'date' not in fields:
+        return None
+    date_time = parse_date(fields.pop('date'))
+    if date_time is None:
+        return None
+    fields.update(date_time)
+    fields.setdefault('version', b'')
+    fields.setdefault('author', b'')
+    fields['filename'] = os.fsencode(os.path.basename(filename))
+    return Id.create(**decode_fields(fields))
+
+
+def parse_date(value):
+    """Split a ``$Date$`` keyword's value into the (UTC) date and time.
+
+    Return `None` if the format is not recognized.
+    """
+    m = RE_RCS_DATE.match(value)
+    if m is not None:
+        return m.groupdict()
+
+    m = RE_SVN_DATE.match(value)
+    if m is not None:
+        date_time = datetime.strptime(
+            m.group(1).decode('ascii'), '%Y-%m-%d %H:%M:%S %z')
+        date_time = date_time.astimezone(timezone.utc)
+        return {
+            'date': date_time.strftime('%Y-%m-%d').encode('ascii'),
+            'time': date_time.strftime('%H:%M:%S').encode('ascii'),
+        }
+
+
+def decode_fields(fields):
+    return {key: value.decode('utf-8', 'replace')
+            for key, value in fields.items()}
+
+
+class Id(namedtuple('Id', [
+        'timestamp', 'filename', 'version', 'date', 'time', 'author'])):
+    """An identifier.
+
+    Identifiers are ordered by the time of the last change (in seconds
+    since the epoch), then by file name and version.
+    """
+
+    __slots__ = ()
 
-    def __init__(self, **kwargs):
-        for key, value in kwargs.iteritems():
-            setattr(self, key, value)
+    @classmethod
+    def create(cls, filename, version, date, time, author):
+        timestamp = timegm((
+            int(date[0:4]), int(date[5:7]), int(date[8:10]),
+            int(time[0:2]), int(time[3:5]), int(time[6:8])))
+        return cls(timestamp, filename, version, date, time, author)
 
-    def __cmp__(self, other):
-        """Specify the sort order of ``Id`` objects."""
-        for attr in ['date', 'time', 'filename', 'version']:
-            result = cmp(getattr(self, attr), getattr(other, attr))
-            if result != 0:
-                return result
-        return 0
 
-    @classmethod
-    def parse_id(cls, line, type_):
-        """Parse id string with compiled pattern."""
-        m = TYPES[type_][1].match(line)
-        if m is not None:
-            return cls(**m.groupdict())
+def find_files(path):
+    """Yield the names of the files to scan."""
+    for root, dirs, files in walk(path):
+        for fname in files:
+            if not has_binary_suffix(fname):
+                yield os.path.join(root, fname)
 
 
-def scan_files(path, opts):
-    """Scan through files, trying to find an id signature."""
+def walk(path):
+    """Like `os.walk`, but skip version control specific directories."""
     for root, dirs, files in os.walk(path):
-        # Skip version control specific directories.
         for type_ in TYPES:
             vc_dir = TYPES[type_][0]
             if vc_dir in dirs:
                 dirs.remove(vc_dir)
+        yield root, dirs, files
+
+
+def has_binary_suffix(fname):
+    """Tell if the file name has one of the defined binary suffixes."""
+    return fname.split('.')[-1] in BINARY_SUFFIXES
 
-        for fname in files:
-            # Skip defined binary file suffixes.
-            if fname.split('.')[-1] in BINARY_SUFFIXES:
-                continue
 
-            # Open file and look for ident line.
-            with open(os.path.join(root, fname), 'rb') as f:
-                id_line = find_id_line(f, opts.num_lines)
-            if id_line:
-                id_ = Id.parse_id(id_line, opts.type)
-                if id_ is not None:
-                    yield id_
+def scan_file(filename, type_, max_lines):
+    """Read the file's beginning and look for an identifier."""
+    try:
+        prefix = read_prefix(filename)
+    except OSError:
+        return None
+    if prefix is None:
+        return None
+    return find_id(prefix, type_, max_lines, filename)
+
+
+def scan_batch(filenames, type_, max_lines):
+    """Scan the files and return their identifiers (or `None`)."""
+    return [scan_file(filename, type_, max_lines) for filename in filenames]
+
+
+def scan_files(path, opts):
+    """Scan through files, trying to find an id signature."""
+    for filename, id_ in scan_filenames(find_files(path), opts):
+        if id_ is not None:
+            yield id_
+
+
+def scan_filenames(filenames, opts):
+    """Scan the files and yield each one's name along with its identifier
+    (or `None`).
+
+    With multiple jobs, batches of files are scanned in a pool of threads
+    (which wait for the file system most of the time).
+    """
+    filenames = iter(filenames)
+    if opts.jobs <= 1:
+        for filename in filenames:
+            yield filename, scan_file(filename, opts.type, opts.num_lines)
+        return
+
+    executor = ThreadPoolExecutor(opts.jobs)
+    # Keep a limited number of batches queued, in order.
+    futures = deque()
+    try:
+        while True:
+            batch = list(islice(filenames, BATCH_FILES))
+            if batch:
+                futures.append((batch, executor.submit(
+                    scan_batch, batch, opts.type, opts.num_lines)))
+            while futures and (not batch or len(futures) > opts.jobs * 4):
+                batch_filenames, future = futures.popleft()
+                for filename, id_ in zip(batch_filenames, future.result()):
+                    yield filename, id_
+            if not batch:
+                break
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+class IdIndex(object):
+    """A persistent index of the identifiers found in the files beneath a
+    directory.
+
+    Identifiers are stored per path (relative to the directory), along
+    with the size and modification time of the file at the time it was
+    scanned.  Files without an identifier are recorded as well, so they
+    are not scanned again either.
+
+    The index is rebuilt if it was created for another directory,
+    repository type, or number of lines to scan.
+    """
+
+    SCHEMA_VERSION = 1
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS settings (
+            root TEXT NOT NULL,
+            type TEXT NOT NULL,
+            num_lines INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ids (
+            path BLOB PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            timestamp INTEGER,
+            filename TEXT,
+            version TEXT,
+            date TEXT,
+            time TEXT,
+            author TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ids_order
+            ON ids (timestamp, filename, version);
+    """
+
+    def __init__(self, filename, root, type_, num_lines):
+        self.root = root
+        self.connection = sqlite3.connect(filename)
+        version, = self.connection.execute('PRAGMA user_version').fetchone()
+        if version != self.SCHEMA_VERSION:
+            self.connection.executescript("""
+                DROP TABLE IF EXISTS settings;
+                DROP TABLE IF EXISTS ids;
+            """)
+            self.connection.execute(
+                'PRAGMA user_version = %d' % self.SCHEMA_VERSION)
+        self.connection.executescript(self.SCHEMA)
+
+        settings = (os.path.abspath(root), type_, num_lines)
+        with self.connection:
+            if self.connection.execute(
+                    'SELECT root, type, num_lines FROM settings'
+                    ).fetchall() != [settings]:
+                self.connection.execute('DELETE FROM settings')
+                self.connection.execute('DELETE FROM ids')
+                self.connection.execute(
+                    'INSERT INTO settings VALUES (?, ?, ?)', settings)
+
+    def update(self, opts):
+        """Scan the files that are new or changed since they were
+        indexed, and remove the entries of files that are gone.
+
+        Return whether any identifiers changed.
+        """
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.connection.execute(
+                'SELECT path, size, mtime_ns FROM ids')}
+
+        stats = {}
+
+        def _find_changed_files():
+            for filename in find_files(self.root):
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                path = self._get_key(filename)
+                if known.pop(path, None) != (stat.st_size, stat.st_mtime_ns):
+                    stats[filename] = stat
+                    yield filename
+
+        with self.connection:
+            changed = self._scan(_find_changed_files(), stats, opts)
+            for path in known:
+                changed |= self._delete('path = ?', path)
+        return changed
+
+    def update_files(self, filenames, opts):
+        """Like `update`, but only look at the given files."""
+        changed = False
+        stats = {}
+        with self.connection:
+            for filename in filenames:
+                path = self._get_key(filename)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    changed |= self._delete('path = ?', path)
+                    continue
+                if self.connection.execute(
+                        'SELECT size, mtime_ns FROM ids WHERE path = ?',
+                        (path,)).fetchone() != (
+                            stat.st_size, stat.st_mtime_ns):
+                    stats[filename] = stat
+            changed |= self._scan(list(stats), stats, opts)
+        return changed
+
+    def remove_tree(self, directory):
+        """Remove the entries of the files beneath the directory.
+
+        Return whether any identifiers were removed.
+        """
+        prefix = self._get_key(directory) + b'/'
+        with self.connection:
+            # Paths beneath the directory sort between its path plus a
+            # slash and its path plus the character following the slash.
+            return self._delete('path >= ? AND path < ?', prefix,
+                                prefix[:-1] + b'0')
+
+    def query(self, top=None):
+        """Return the identifiers, ordered by the time of the last change
+        (or only the ``top`` latest ones).
+        """
+        sql = 'SELECT timestamp, filename, version, date, time, author ' \
+              'FROM ids WHERE timestamp IS NOT NULL '
+        if top is None:
+            rows = self.connection.execute(
+                sql + 'ORDER BY timestamp, filename, version')
+            return [Id(*row) for row in rows]
+
+        rows = self.connection.execute(
+            sql + 'ORDER BY timestamp DESC, filename DESC, version DESC '
+            'LIMIT ?', (top,))
+        return [Id(*row) for row in rows][::-1]
+
+    def close(self):
+        self.connection.close()
+
+    def _get_key(self, filename):
+        path = os.path.relpath(filename, self.root)
+        return os.fsencode(path).replace(os.sep.encode(), b'/')
+
+    def _scan(self, filenames, stats, opts):
+        """Scan the files and store their identifiers along with their
+        stats (taken before scanning, so changes made meanwhile are
+        picked up next time).
+
+        Return whether any identifiers changed.
+        """
+        changed = False
+        for filename, id_ in scan_filenames(filenames, opts):
+            stat = stats.pop(filename)
+            path = self._get_key(filename)
+            changed |= id_ != self._get(path)
+            fields = (None,) * len(Id._fields) if id_ is None else id_
+            self.connection.execute(
+                'INSERT OR REPLACE INTO ids '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime_ns) + tuple(fields))
+        return changed
+
+    def _get(self, path):
+        row = self.connection.execute(
+            'SELECT timestamp, filename, version, date, time, author '
+            'FROM ids WHERE path = ? AND timestamp IS NOT NULL',
+            (path,)).fetchone()
+        return Id(*row) if row is not None else None
+
+    def _delete(self, condition, *parameters):
+        """Delete entries, and return whether any identifiers were among
+        them.
+        """
+        had_ids = self.connection.execute(
+            'SELECT COUNT(*) FROM ids WHERE timestamp IS NOT NULL AND ' +
+            condition, parameters).fetchone()[0] > 0
+        self.connection.execute('DELETE FROM ids WHERE ' + condition,
+                                parameters)
+        return had_ids
+
+
+# inotify(7) constants
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# Changes to files are only looked at once they are closed after
+# writing, or moved into place.
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_ONLYDIR)
+
+# How long to wait for further changes before reporting them, in seconds
+WATCH_DELAY = 0.1
+
+
+class Inotify(object):
+    """Watch directory trees for changes with Linux's inotify API (called
+    through ctypes).
+
+    Raise `OSError` if it is not available.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                    ctypes.c_uint32]
+        self.fd = init(IN_CLOEXEC)
+        if self.fd < 0:
+            raise_errno()
+        # the watched directories by watch descriptor
+        self.directories = {}
+
+    def add_tree(self, top):
+        """Watch the directory and those beneath it (except version control
+        specific ones).
+        """
+        for root, dirs, files in walk(top):
+            self.add(root)
+
+    def add(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                return  # vanished in the meantime
+            raise_errno()
+        self.directories[wd] = directory
+
+    def read_events(self):
+        """Wait for changes, and return the path and the mask of each
+        event (or `None` if events were lost).
+        """
+        events = []
+        timeout = None
+        while select.select([self.fd], [], [], timeout)[0]:
+            data = os.read(self.fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                if mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                    continue
+                directory = self.directories.get(wd)
+                if directory is not None and name:
+                    events.append(
+                        (os.path.join(directory, os.fsdecode(name)), mask))
+            # Collect further events that are about to follow.
+            timeout = WATCH_DELAY
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def raise_errno():
+    error = ctypes.get_errno()
+    raise OSError(error, os.strerror(error))
+
+
+def watch(index, opts, show):
+    """Keep the index up to date, and show the identifiers whenever they
+    change.
+
+    Changes are picked up through inotify if available.  Otherwise, all
+    files are checked for changes every few seconds.
+    """
+    try:
+        watcher = Inotify()
+        watcher.add_tree(index.root)
+    except OSError:
+        watcher = None
+
+    index.update(opts)
+    show()
+    while True:
+        if watcher is None:
+            time.sleep(opts.interval)
+            changed = index.update(opts)
+        else:
+            try:
+                changed = process_events(index, watcher, opts)
+            except OSError:
+                # The limit of watches has been reached, most likely.
+                watcher.close()
+                watcher = None
+                changed = index.update(opts)
+        if changed:
+            show()
+
+
+def process_events(index, watcher, opts):
+    """Wait for changes and update the index accordingly.
+
+    Return whether any identifiers changed.
+    """
+    events = watcher.read_events()
+    if events is None:
+        return index.update(opts)
+
+    changed = False
+    filenames = {}
+    for path, mask in events:
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                watcher.add_tree(path)
+                filenames.update(dict.fromkeys(find_files(path)))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changed |= index.remove_tree(path)
+        elif not has_binary_suffix(os.path.basename(path)):
+            filenames[path] = None
+    changed |= index.update_files(filenames, opts)
+    return changed
+
+
+def format_ids(ids, opts):
+    format = '%(date)s %(time)s %(filename)s'
+    if opts.authors:
+        format += ' [%(author)s]'
+    for id_ in ids:
+        yield format % id_._asdict()
 
 
 def parse_args():
@@ -132,10 +665,11 @@ def parse_args():
 
     parser.add_option(
         '-t', '--type',
-        choices=TYPES.keys() + ['auto'],
+        choices=sorted(TYPES) + ['auto'],
         dest='type',
         default='auto',
-        help='repository type: %s or auto (default)' % ', '.join(TYPES.keys())
+        help='repository type: %s or auto (default)'
+             % ', '.join(sorted(TYPES))
         )
 
     parser.add_option(
@@ -145,12 +679,52 @@ def parse_args():
         default=False,
         help='display last authors')
 
+    parser.add_option(
+        '-j', '--jobs',
+        dest='jobs',
+        type='int',
+        default=1,
+        help='number of threads to scan files with (default: 1)')
+
+    parser.add_option(
+        '--top',
+        dest='top',
+        type='int',
+        metavar='N',
+        help='only show the N files changed last')
+
+    parser.add_option(
+        '-i', '--index',
+        dest='index',
+        metavar='INDEX',
+        help='keep the identifiers in an index file (created if not '
+             'existing) and only scan files whose size or modification '
+             'time changed since the last run')
+
+    parser.add_option(
+        '-w', '--watch',
+        action='store_true',
+        dest='watch',
+        default=False,
+        help='keep watching for changes and show the files again whenever '
+             'the identifiers change (through inotify if available, '
+             'otherwise checking all files every few seconds)')
+
+    parser.add_option(
+        '--interval',
+        dest='interval',
+        type='float',
+        default=2.0,
+        help='seconds between checks for changes when watching without '
+             'inotify (default: 2)')
+
     parser.add_option(
         '-n', '--num-lines',
         dest='num_lines',
         type='int',
         default=10,
-        help='maximum number of lines to scan')
+        help='maximum number of lines to scan (within the first %d '
+             'bytes)' % PREFIX_SIZE)
 
     # Process options and arguments.
     opts, args = parser.parse_args()
@@ -173,16 +747,51 @@ def parse_args():
 def main():
     opts, args = parse_args()
 
-    # Scan.
-    ids = list(scan_files(args[0], opts))
+    if opts.index or opts.watch:
+        # Without an index file, watch with an in-memory index.
+        index = IdIndex(opts.index or ':memory:', args[0], opts.type,
+                        opts.num_lines)
+
+        shown_lines = []
+
+        def show():
+            lines = list(format_ids(index.query(opts.top), opts))
+            if opts.watch:
+                # Changes may not have affected the files shown.
+                if lines == shown_lines:
+                    return
+                shown_lines[:] = lines
+                lines.append('')
+            for line in lines:
+                print(line, flush=True)
+
+        try:
+            if opts.watch:
+                watch(index, opts, show)
+            else:
+                index.update(opts)
+                show()
+        except KeyboardInterrupt:
+            sys.exit(130)
+        finally:
+            index.close()
+        return
+
+    # Scan and sort (or only keep the latest identifiers).
+    ids = scan_files(args[0], opts)
+    try:
+        if opts.top is not None:
+            ids = nlargest(opts.top, ids)
+            ids.reverse()
+        else:
+            ids = sorted(ids)
+    except KeyboardInterrupt:
+        sys.exit(130)
 
     # Print sorted results.
-    ids.sort()
-    format = '%(date)s %(time)s %(filename)s'
-    if opts.authors:
-        format += ' [%(author)s]'
-    for id_ in ids:
-        print format % id_.__dict__
+    for line in format_ids(ids, opts):
+        print(line)
+
 
 if __name__ == '__main__':
     main()
@@ -8,40 +8,724 @@ File Recognizer
 This tool tries to aid in recognizing files after they were recovered (e.g.
 after a hard drive failure) with some software that left them uniformly named.
 
-It grabs the output of the UNIX ``file`` utility (a Windows binary is
-available from ``http://gnuwin32.sourceforge.net/``) and moves files with a
-specified type into accordant subdirectories.
+It recognizes the type of each file by the magic numbers at its beginning and
+moves files with a specified type into accordant subdirectories.  Only the
+first few hundred bytes of each file are read.
 
-Run it in the directory where the files are in.  Make backups before doing so!
+Along the way, duplicates can be set aside, and pictures can be renamed after
+the date they were taken (from their Exif data) or their dimensions, in the
+same single read of each file.  A dry run shows what would be done.
+
+Files of types that are not recognized that way can be passed on to the UNIX
+``file`` utility (a Windows binary is available from
+``http://gnuwin32.sourceforge.net/``), in batches of many files per run.
+
+Run it in the directory where the files are in (or specify that directory).
+Make backups before doing so!  The moves can be recorded in a journal, so an
+interrupted run can be resumed.
 
 :Copyright: 2006-2014 Jochen Kupperschmidt
 :Date: 05-Jul-2014 (original release: 30-May-2006)
 :License: MIT
 """
 
+from argparse import ArgumentParser
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import hashlib
+from itertools import islice
+import json
 import os
+import re
+import struct
+import subprocess
+import sys
+
+
+# A file type is recognized if the file contains all of the signature's
+# parts, each given as offset and magic number.  The description is how
+# the `file` utility's output starts for this type.
+Signature = namedtuple('Signature', ['type', 'description', 'parts'])
 
+SIGNATURES = [
+    Signature('JPEG', 'JPEG image data', [(0, b'\xff\xd8\xff')]),
+    Signature('TIFF', 'TIFF image data', [(0, b'II*\0')]),
+    Signature('TIFF', 'TIFF image data', [(0, b'MM\0*')]),
+    Signature('PNG', 'PNG image data', [(0, b'\x89PNG\r\n\x1a\n')]),
+    Signature('GIF', 'GIF image data', [(0, b'GIF87a')]),
+    Signature('GIF', 'GIF image data', [(0, b'GIF89a')]),
+    Signature('BMP', 'PC bitmap', [(0, b'BM'), (6, b'\0\0\0\0')]),
+    Signature('PSD', 'Adobe Photoshop Image', [(0, b'8BPS')]),
+    Signature('WEBP', 'RIFF (little-endian) data, Web/P image',
+              [(0, b'RIFF'), (8, b'WEBP')]),
+    Signature('WAVE', 'RIFF (little-endian) data, WAVE audio',
+              [(0, b'RIFF'), (8, b'WAVE')]),
+    Signature('AVI', 'RIFF (little-endian) data, AVI',
+              [(0, b'RIFF'), (8, b'AVI ')]),
+    Signature('MP3', 'Audio file with ID3', [(0, b'ID3')]),
+    Signature('OGG', 'Ogg data', [(0, b'OggS')]),
+    Signature('FLAC', 'FLAC audio', [(0, b'fLaC')]),
+    Signature('MIDI', 'Standard MIDI data', [(0, b'MThd')]),
+    Signature('MP4', 'ISO Media', [(4, b'ftyp')]),
+    Signature('PDF', 'PDF document', [(0, b'%PDF-')]),
+    Signature('PS', 'PostScript document', [(0, b'%!PS')]),
+    Signature('RTF', 'Rich Text Format data', [(0, b'{\\rtf')]),
+    Signature('XML', 'XML', [(0, b'<?xml')]),
+    Signature('OLE2', 'Composite Document File',
+              [(0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1')]),
+    Signature('SQLITE', 'SQLite 3.x database', [(0, b'SQLite format 3\0')]),
+    Signature('ZIP', 'Zip archive data', [(0, b'PK\x03\x04')]),
+    Signature('GZIP', 'gzip compressed data', [(0, b'\x1f\x8b')]),
+    Signature('BZIP2', 'bzip2 compressed data', [(0, b'BZh')]),
+    Signature('XZ', 'XZ compressed data', [(0, b'\xfd7zXZ\0')]),
+    Signature('7Z', '7-zip archive data', [(0, b"7z\xbc\xaf'\x1c")]),
+    Signature('RAR', 'RAR archive data', [(0, b'Rar!\x1a\x07')]),
+    Signature('TAR', 'POSIX tar archive', [(257, b'ustar')]),
+    Signature('ELF', 'ELF', [(0, b'\x7fELF')]),
+    Signature('CLASS', 'compiled Java class data', [(0, b'\xca\xfe\xba\xbe')]),
+    Signature('EXE', 'PE32', [(0, b'MZ')]),
+]
+
+# The number of bytes needed to check all signatures
+PREFIX_SIZE = max(offset + len(magic)
+                  for signature in SIGNATURES
+                  for offset, magic in signature.parts)
+
+# File name extensions for renamed files
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'TIFF': '.tif',
+}
 
 # Define a file types to move to subfolders (which will be created if not yet
-# existing) if `file`'s output starts with one of these strings.
+# existing) by default.
 TYPES = frozenset(['JPEG', 'TIFF', 'PNG'])
 
+# The number of files each thread looks at, and each run of `file` is
+# passed, at once.
+BATCH_FILES = 100
+FILE_BATCH_FILES = 1000
+
+# The number of bytes to look for metadata in (as Exif data is stored in
+# a JPEG segment of at most 64 KiB, near the start), and to read at once
+# beyond that when hashing
+HEAD_SIZE = 64 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+HASH_NAME = 'md5'
+
+# The number of moves carried out between checkpoints of the journal
+JOURNAL_BATCH_MOVES = 1000
+
+# Duplicates are moved into this subfolder.
+DUPLICATES_FOLDER = 'DUPLICATES'
+
+FileInfo = namedtuple('FileInfo', ['filename', 'type', 'digest', 'metadata'])
+
+TIFF_BYTE_ORDERS = {b'II': '<', b'MM': '>'}
+
+# Exif tags: DateTimeOriginal, DateTime; pointer to the Exif IFD
+DATE_TAGS = (0x9003, 0x0132)
+EXIF_IFD_TAG = 0x8769
+
+RE_EXIF_DATE = re.compile(
+    br'(\d{4}):(\d{2}):(\d{2}) (\d{2}):(\d{2}):(\d{2})$')
+
+
+def compile_signatures(signatures):
+    """Return a function that recognizes the type of a file (given as the
+    bytes at its beginning), or returns `None`.
+
+    Signatures are looked up by the first byte, so only few of them need
+    to be checked.
+    """
+    by_first_byte = defaultdict(list)
+    elsewhere = []
+    for signature in signatures:
+        offset, magic = signature.parts[0]
+        if offset == 0:
+            by_first_byte[magic[0]].append(signature)
+        else:
+            elsewhere.append(signature)
+
+    def recognize(prefix):
+        candidates = by_first_byte.get(prefix[0], []) if prefix else []
+        for signature in candidates + elsewhere:
+            if all(prefix.startswith(magic, offset)
+                   for offset, magic in signature.parts):
+                return signature.type
+        return None
+
+    return recognize
+
+
+recognize = compile_signatures(SIGNATURES)
+
+
+def inspect_file(filename, types=None, dedupe=False, rename=False,
+                 type_=None):
+    """Recognize the type of the file (unless given) and, if it is one of
+    the types, hash its contents and extract metadata from its beginning.
+
+    The file is read just once: only as far as needed to recognize its
+    type, through to its end if it is hashed, and metadata is only looked
+    for in the bytes read at first.
+    """
+    head_size = HEAD_SIZE if dedupe or rename else PREFIX_SIZE
+    try:
+        with open(filename, 'rb') as f:
+            head = f.read(head_size)
+            if type_ is None:
+                type_ = recognize(head)
+            if type_ is None or (types is not None and type_ not in types):
+                return FileInfo(filename, type_, None, None)
+
+            metadata = extract_metadata(type_, head) if rename else None
+
+            digest = None
+            if dedupe:
+                hash = hashlib.new(HASH_NAME, head)
+                for block in iter(partial(f.read, BLOCK_SIZE), b''):
+                    hash.update(block)
+                digest = hash.hexdigest()
+    except OSError:
+        return FileInfo(filename, None, None, None)
+    return FileInfo(filename, type_, digest, metadata)
+
+
+def split_into_batches(iterable, size):
+    """Return an iterator over lists of up to ``size`` consecutive
+    elements.
+    """
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+def inspect_files(filenames, jobs, inspect=inspect_file):
+    """Yield information on each file (see `inspect_file`).
+
+    With multiple jobs, batches of files are looked at in a pool of
+    threads (which wait for the file system most of the time).  Up to
+    four batches per thread are submitted ahead of the one whose results
+    are being yielded, and another one is submitted as each is taken.
+    """
+    if jobs <= 1:
+        for filename in filenames:
+            yield inspect(filename)
+        return
+
+    batches = split_into_batches(filenames, BATCH_FILES)
+    executor = ThreadPoolExecutor(jobs)
+    try:
+        pending = deque(executor.submit(list, map(inspect, batch))
+                        for batch in islice(batches, jobs * 4))
+        while pending:
+            file_infos = pending.popleft().result()
+            for batch in islice(batches, 1):
+                pending.append(executor.submit(list, map(inspect, batch)))
+            for file_info in file_infos:
+                yield file_info
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def run_file(filenames):
+    """Run the `file` utility on the files, and return the type of each
+    one (or `None`) according to its output.
+    """
+    output = subprocess.run(
+        ['file', '-b', '-n', '-p', '--'] + filenames,
+        stdout=subprocess.PIPE, check=True).stdout
+    descriptions = output.decode('utf-8', 'replace').splitlines()
+    if len(descriptions) != len(filenames):
+        # Cannot tell which description belongs to which file.
+        return [None] * len(filenames)
+    return [get_type_by_description(description)
+            for description in descriptions]
+
+
+def get_type_by_description(description):
+    for signature in SIGNATURES:
+        if description.startswith(signature.description):
+            return signature.type
+    return None
+
+
+def inspect_files_with_fallback(filenames, jobs, inspect=inspect_file):
+    """Like `inspect_files`, but run the `file` utility on files that
+    were not recognized.
+
+    Those files are yielded later than the others.  If they need to be
+    hashed or to have their metadata extracted, they are read again.
+    """
+    unrecognized = []
+
+    def _run_file():
+        for filename, type_ in zip(unrecognized, run_file(unrecognized)):
+            if type_ is not None:
+                yield inspect(filename, type_=type_)
+            else:
+                yield FileInfo(filename, None, None, None)
+        del unrecognized[:]
+
+    for file_info in inspect_files(filenames, jobs, inspect):
+        if file_info.type is not None:
+            yield file_info
+            continue
+        unrecognized.append(file_info.filename)
+        if len(unrecognized) >= FILE_BATCH_FILES:
+            for file_info in _run_file():
+                yield file_info
+    if unrecognized:
+        for file_info in _run_file():
+            yield file_info
+
+
+def extract_metadata(type_, head):
+    """Extract metadata from the file's beginning.
+
+    Return a dictionary (which is empty if nothing was found).
+    """
+    try:
+        if type_ == 'JPEG':
+            tiff = find_jpeg_exif(head)
+            return read_exif_date(tiff) if tiff is not None else {}
+        elif type_ == 'TIFF':
+            return read_exif_date(head)
+        elif type_ == 'PNG' and head[12:16] == b'IHDR':
+            width, height = struct.unpack_from('>LL', head, 16)
+            return {'width': width, 'height': height}
+    except (struct.error, IndexError):
+        pass  # truncated (or not in the bytes read)
+    return {}
+
+
+def find_jpeg_exif(data):
+    """Return the TIFF structure in the JPEG's Exif segment, if any."""
+    offset = 2
+    while offset + 4 <= len(data) and data[offset] == 0xff:
+        marker = data[offset + 1]
+        if marker in (0xd9, 0xda):
+            break  # end of image, start of scan
+        length, = struct.unpack_from('>H', data, offset + 2)
+        segment = data[offset + 4:offset + 2 + length]
+        if marker == 0xe1 and segment.startswith(b'Exif\0\0'):
+            return segment[6:]
+        offset += 2 + length
+    return None
+
+
+def read_exif_date(tiff):
+    """Read the date the picture was taken (or, failing that, the date
+    it was last changed) from the TIFF structure.
+    """
+    byte_order = TIFF_BYTE_ORDERS.get(tiff[:2])
+    if byte_order is None:
+        return {}  # damaged
+    ifd_offset, = struct.unpack_from(byte_order + 'L', tiff, 4)
+    tags = read_ifd(tiff, byte_order, ifd_offset)
+    if EXIF_IFD_TAG in tags:
+        exif_offset = tags[EXIF_IFD_TAG]
+        tags.update(read_ifd(tiff, byte_order, exif_offset))
+
+    for tag in DATE_TAGS:
+        if tag in tags:
+            m = RE_EXIF_DATE.match(tags[tag])
+            if m is not None:
+                date = b'%s-%s-%s %s:%s:%s' % m.groups()
+                return {'date': date.decode('ascii')}
+    return {}
+
+
+def read_ifd(tiff, byte_order, offset):
+    """Read the date and Exif IFD pointer entries from the image file
+    directory.
+    """
+    entry_count, = struct.unpack_from(byte_order + 'H', tiff, offset)
+    tags = {}
+    for i in range(entry_count):
+        tag, type_, count, value = struct.unpack_from(
+            byte_order + 'HHLL', tiff, offset + 2 + i * 12)
+        if tag == EXIF_IFD_TAG and type_ == 4:  # LONG
+            tags[tag] = value
+        elif tag in DATE_TAGS and type_ == 2 and count == 20:  # ASCII
+            tags[tag] = tiff[value:value + 19]
+    return tags
+
+
+def plan_moves(file_infos, path, types, dedupe=False, rename=False,
+               originals=None, taken=None):
+    """Decide where to move the files of the types to.
+
+    Yield each file's information, destination, and (if it is a duplicate
+    of a file seen before) the name of the original file.
+
+    Duplicates are moved into the ``DUPLICATES`` subfolder.  Files whose
+    metadata includes a date or dimensions are renamed accordingly.  A
+    number is appended to names that are already taken, either by an
+    existing file or by a planned move in ``taken`` (which moves that
+    have been carried out can be removed from).
 
-def create_folders():
-    for folder in TYPES:
+    ``originals`` maps the digests of files moved before to their names.
+    """
+    if originals is None:
+        originals = {}
+    if taken is None:
+        taken = set()
+    for file_info in file_infos:
+        if file_info.type not in types:
+            continue
+
+        folder = file_info.type
+        original = None
+        if dedupe:
+            original = originals.setdefault(
+                file_info.digest, file_info.filename)
+            if original == file_info.filename:
+                original = None
+            else:
+                folder = DUPLICATES_FOLDER
+
+        name = os.path.basename(file_info.filename)
+        if rename:
+            name = get_name(file_info) or name
+
+        destination = get_free_name(os.path.join(path, folder, name), taken)
+        taken.add(destination)
+        yield file_info, destination, original
+
+
+def get_name(file_info):
+    """Put a file name together from the file's metadata, if possible."""
+    metadata = file_info.metadata or {}
+    extension = EXTENSIONS.get(file_info.type, '')
+    if 'date' in metadata:
+        return metadata['date'].replace(':', '-').replace(' ', '_') + \
+            extension
+    if 'width' in metadata:
+        stem = os.path.basename(file_info.filename)
+        if stem.lower().endswith(extension):
+            stem = stem[:-len(extension)]
+        return '{:d}x{:d}_{}{}'.format(
+            metadata['width'], metadata['height'], stem, extension)
+    return None
+
+
+def get_free_name(filename, taken):
+    """Append a number to the file name if it is taken (or exists)."""
+    stem, extension = os.path.splitext(filename)
+    candidate = filename
+    number = 1
+    while candidate in taken or os.path.lexists(candidate):
+        number += 1
+        candidate = '{}_{:d}{}'.format(stem, number, extension)
+    return candidate
+
+
+def create_move_record(file_info, destination, original):
+    """Create a record (to be serialized as JSON) describing a move."""
+    record = {
+        'source': file_info.filename,
+        'destination': destination,
+        'type': file_info.type,
+    }
+    if file_info.digest is not None:
+        record[HASH_NAME] = file_info.digest
+    if original is not None:
+        record['duplicate_of'] = original
+    if file_info.metadata:
+        record.update(file_info.metadata)
+    return record
+
+
+class MoveJournal(object):
+    """An append-only journal of moves, which allows to resume after an
+    interruption.
+
+    Each line is a JSON object.  Moves are carried out in batches: The
+    moves of a batch are recorded as planned (and that record is flushed
+    to disk) before any of them is carried out.  Once all of them are,
+    they are recorded as done, which makes a checkpoint.
+
+    When resuming, moves planned after the last checkpoint are checked
+    against the file system to tell if they were carried out.  Files
+    that were not moved yet are still found in the directory.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+
+    def recover(self, dedupe=False):
+        """Read the journal, and record interrupted moves that were
+        carried out as done.
+
+        If ``dedupe`` is set, return the digests of the files moved so far
+        (mapped to their original names).  Otherwise, the returned mapping
+        is empty.
+
+        Only the last batch can have been interrupted, as a batch is only
+        planned after the previous one is done, so the moves of earlier
+        batches are not kept.
+        """
+        originals = {}
+        batch = {}  # moves of the last batch that are not recorded as done
+        batch_done = False
+
+        def _add_original(record):
+            if dedupe and HASH_NAME in record:
+                originals.setdefault(
+                    record[HASH_NAME],
+                    record.get('duplicate_of', record['source']))
+
+        size = 0  # of the complete lines
+        incomplete = False
+        try:
+            with open(self.filename, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        incomplete = True
+                        break
+                    if not line.endswith(b'\n'):
+                        incomplete = True
+                        break
+                    size += len(line)
+                    if record['op'] == 'plan':
+                        if batch_done:
+                            # The moves left were not carried out (as their
+                            # files vanished, or they are planned again).
+                            batch.clear()
+                            batch_done = False
+                        batch[record['source']] = record
+                    elif record['op'] == 'done':
+                        batch_done = True
+                        planned = batch.pop(record['source'], None)
+                        if planned is not None:
+                            _add_original(planned)
+        except FileNotFoundError:
+            pass
+
+        if incomplete:
+            # Cut off the last line before appending to the journal.
+            os.truncate(self.filename, size)
+        self.file = open(self.filename, 'a', encoding='utf-8')
+        completed = [record for record in batch.values()
+                     if os.path.lexists(record['destination'])
+                     and not os.path.lexists(record['source'])]
+        self._write_records(
+            {'op': 'done', 'source': record['source']}
+            for record in completed)
+        for record in completed:
+            _add_original(record)
+
+        return originals
+
+    def move(self, moves):
+        """Carry out the moves (given as lists of the file information,
+        destination, and original file name), journaling them.
+        """
+        records = [dict(create_move_record(*move), op='plan')
+                   for move in moves]
+        self._write_records(records)
+
+        done = []
+        for record in records:
+            try:
+                os.rename(record['source'], record['destination'])
+            except FileNotFoundError:
+                continue  # vanished in the meantime
+            done.append(record)
+
+        # Make sure the moves are on disk before recording them as done.
+        directories = set()
+        for record in done:
+            directories.add(os.path.dirname(record['source']))
+            directories.add(os.path.dirname(record['destination']))
+        for directory in directories:
+            sync_directory(directory)
+
+        self._write_records(
+            {'op': 'done', 'source': record['source']} for record in done)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def _write_records(self, records):
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+
+def sync_directory(directory):
+    """Flush changes to the directory (i.e. renames) to disk, if the
+    platform allows to.
+    """
+    try:
+        fd = os.open(directory or os.curdir, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def move_in_batches(moves, journal, taken):
+    """Carry out the moves in batches, journaling them."""
+    batch = []
+    for move in moves:
+        batch.append(move)
+        if len(batch) >= JOURNAL_BATCH_MOVES:
+            journal.move(batch)
+            taken.clear()
+            batch = []
+    if batch:
+        journal.move(batch)
+
+
+def list_files(path):
+    """Yield the names of the files in the directory, as they are
+    listed.
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    yield entry.path
+            except OSError:
+                pass
+
+
+def create_folders(path, folders):
+    for folder in folders:
+        folder = os.path.join(path, folder)
         if not os.path.isdir(folder):
             os.mkdir(folder)
 
 
-if __name__ == '__main__':
-    create_folders()
+def parse_args():
+    """Parse command line arguments."""
+    parser = ArgumentParser(
+        description='Move files into subdirectories named after their type.')
 
-    for entry in os.listdir('.'):
-        if not os.path.isfile(entry):
-            continue
+    parser.add_argument(
+        'path',
+        metavar='PATH',
+        nargs='?',
+        default=os.curdir,
+        help='the directory the files are in (default: the current one)')
+
+    parser.add_argument(
+        '-t', '--type',
+        dest='types',
+        choices=sorted(set(signature.type for signature in SIGNATURES)),
+        action='append',
+        help='a type of files to move; can be given multiple times '
+             '(default: %s)' % ', '.join(sorted(TYPES)))
+
+    parser.add_argument(
+        '-j', '--jobs',
+        dest='jobs',
+        type=int,
+        default=1,
+        help='number of threads to read files with (default: 1)')
+
+    parser.add_argument(
+        '-d', '--dedupe',
+        dest='dedupe',
+        action='store_true',
+        help='move files with the same contents as one moved before into '
+             'the %s subfolder instead' % DUPLICATES_FOLDER)
+
+    parser.add_argument(
+        '-r', '--rename',
+        dest='rename',
+        action='store_true',
+        help='rename JPEG and TIFF files after the date in their Exif data, '
+             'and prefix PNG files\' names with their dimensions')
 
-        detected = os.popen('file -b -n -p %s' % entry).read()
-        for type in TYPES:
-            if detected.startswith(type):
-                os.rename(entry, os.path.join(type, entry))
-                break
+    parser.add_argument(
+        '-n', '--dry-run',
+        dest='dry_run',
+        action='store_true',
+        help='do not move anything, but write a manifest of the moves '
+             '(one JSON object per line)')
+
+    parser.add_argument(
+        '--journal',
+        dest='journal',
+        metavar='FILE',
+        help='record the moves in a journal file, and resume after the '
+             'moves recorded there if it exists')
+
+    parser.add_argument(
+        '--file-fallback',
+        dest='file_fallback',
+        action='store_true',
+        help='run the `file` utility on files whose type was not '
+             'recognized')
+
+    args = parser.parse_args()
+
+    if args.journal and args.dry_run:
+        parser.error('--journal cannot be combined with --dry-run')
+
+    return args
+
+
+def main():
+    args = parse_args()
+    types = frozenset(args.types or TYPES)
+
+    if not args.dry_run:
+        folders = set(types)
+        if args.dedupe:
+            folders.add(DUPLICATES_FOLDER)
+        create_folders(args.path, folders)
+
+    filenames = list_files(args.path)
+    inspect = partial(inspect_file, types=types, dedupe=args.dedupe,
+                      rename=args.rename)
+    if args.file_fallback:
+        file_infos = inspect_files_with_fallback(filenames, args.jobs, inspect)
+    else:
+        file_infos = inspect_files(filenames, args.jobs, inspect)
+
+    journal = MoveJournal(args.journal) if args.journal else None
+    try:
+        originals = {}
+        if journal is not None:
+            originals = journal.recover(args.dedupe)
+        taken = set()
+        moves = plan_moves(file_infos, args.path, types, args.dedupe,
+                           args.rename, originals, taken)
+
+        if journal is not None:
+            move_in_batches(moves, journal, taken)
+        elif args.dry_run:
+            for move in moves:
+                print(json.dumps(create_move_record(*move),
+                                 ensure_ascii=False))
+        else:
+            for file_info, destination, original in moves:
+                os.rename(file_info.filename, destination)
+                taken.discard(destination)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except (OSError, subprocess.CalledProcessError) as e:
+        sys.exit(e)
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import struct
+from tempfile import TemporaryDirectory
+import unittest
+
+from recognize import extract_metadata, FileInfo, get_free_name, \
+    inspect_file, inspect_files, MoveJournal, plan_moves, recognize
+
+
+PNG_HEADER = (b'\x89PNG\r\n\x1a\n' + b'\0\0\0\x0dIHDR' +
+              b'\0\0\x02\x80\0\0\x01\xe0' + b'\x08\x02\0\0\0')
+
+
+class RecognizeTest(unittest.TestCase):
+
+    def test_signatures(self):
+        for expected, prefix in [
+                ('JPEG', b'\xff\xd8\xff\xe0\0\x10JFIF\0'),
+                ('TIFF', b'II*\0\x08\0\0\0'),
+                ('TIFF', b'MM\0*\0\0\0\x08'),
+                ('PNG', PNG_HEADER),
+                ('BMP', b'BM\x36\0\x0c\0\0\0\0\0'),
+                ('WAVE', b'RIFF\x24\0\0\0WAVEfmt '),
+                ('MP4', b'\0\0\0\x18ftypmp42'),
+                ('TAR', b'a.txt' + b'\0' * 252 + b'ustar\x0000'),
+                (None, b'BM not a bitmap'),
+                (None, b'RIFF\x24\0\0\0XXXX'),
+                (None, b'plain text'),
+                (None, b'')]:
+            self.assertEqual(recognize(prefix), expected, prefix)
+
+
+def create_tiff(byte_order, date_tag=0x9003):
+    """Create a TIFF structure with the date in the Exif IFD (if it is
+    DateTimeOriginal) or in the first IFD.
+    """
+    fmt = '<' if byte_order == b'II' else '>'
+    date = b'2014:07:05 12:34:56\0'
+
+    def _ifd(tag, type_, count, value):
+        return struct.pack(fmt + 'HHHLLL', 1, tag, type_, count, value, 0)
+
+    if date_tag == 0x9003:
+        # Header, first IFD pointing to the Exif IFD, Exif IFD
+        return (byte_order + struct.pack(fmt + 'HL', 42, 8) +
+                _ifd(0x8769, 4, 1, 26) + _ifd(date_tag, 2, 20, 44) + date)
+    return (byte_order + struct.pack(fmt + 'HL', 42, 8) +
+            _ifd(date_tag, 2, 20, 26) + date)
+
+
+def create_jpeg(tiff):
+    jfif = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\0' + b'\0' * 9
+    exif = b'Exif\0\0' + tiff
+    return (b'\xff\xd8' + jfif + b'\xff\xe1' +
+            struct.pack('>H', 2 + len(exif)) + exif + b'\xff\xda\0\x08')
+
+
+class ExtractMetadataTest(unittest.TestCase):
+
+    def test_jpeg(self):
+        head = create_jpeg(create_tiff(b'II'))
+        self.assertEqual(recognize(head), 'JPEG')
+        self.assertEqual(extract_metadata('JPEG', head),
+                         {'date': '2014-07-05 12:34:56'})
+
+    def test_tiff(self):
+        for byte_order in b'II', b'MM':
+            head = create_tiff(byte_order, date_tag=0x0132)
+            self.assertEqual(recognize(head), 'TIFF')
+            self.assertEqual(extract_metadata('TIFF', head),
+                             {'date': '2014-07-05 12:34:56'})
+
+    def test_png(self):
+        self.assertEqual(extract_metadata('PNG', PNG_HEADER),
+                         {'width': 640, 'height': 480})
+
+    def test_damaged(self):
+        tiff = create_tiff(b'MM')
+        for type_, head in [
+                ('JPEG', create_jpeg(b'XX*\0' + tiff[4:])),
+                ('JPEG', create_jpeg(tiff)[:40]),
+                ('JPEG', b'\xff\xd8\xff'),
+                ('TIFF', tiff[:20]),
+                ('TIFF', tiff[:8] + b'\xff' * 20),
+                ('PNG', PNG_HEADER[:20])]:
+            self.assertEqual(extract_metadata(type_, head), {})
+
+
+class PlanMovesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+        os.mkdir(os.path.join(self.path, 'PNG'))
+        open(os.path.join(self.path, 'PNG', '640x480_b.png'), 'w').close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_dedupe_and_rename(self):
+        size = {'width': 640, 'height': 480}
+        date = {'date': '2014-07-05 12:34:56'}
+        file_infos = [
+            FileInfo(self.file('a.png'), 'PNG', 'd1', size),
+            FileInfo(self.file('b.png'), 'PNG', 'd2', size),
+            FileInfo(self.file('c'), 'JPEG', 'd3', date),
+            FileInfo(self.file('d'), 'JPEG', 'd1', date),
+            FileInfo(self.file('e'), 'JPEG', 'd4', {}),
+            FileInfo(self.file('f'), 'GIF', 'd5', None),
+        ]
+        moves = [
+            (os.path.basename(file_info.filename),
+             os.path.relpath(destination, self.path),
+             original and os.path.basename(original))
+            for file_info, destination, original in plan_moves(
+                file_infos, self.path, {'JPEG', 'PNG'}, dedupe=True,
+                rename=True, originals={'d4': 'x'})]
+
+        self.assertEqual(moves, [
+            ('a.png', os.path.join('PNG', '640x480_a.png'), None),
+            ('b.png', os.path.join('PNG', '640x480_b_2.png'), None),
+            ('c', os.path.join('JPEG', '2014-07-05_12-34-56.jpg'), None),
+            ('d', os.path.join('DUPLICATES', '2014-07-05_12-34-56.jpg'),
+             'a.png'),
+            ('e', os.path.join('DUPLICATES', 'e'), 'x'),
+        ])
+
+    def test_free_name(self):
+        filename = os.path.join(self.path, 'PNG', '640x480_b.png')
+        taken = {os.path.join(self.path, 'PNG', '640x480_b_2.png')}
+        self.assertEqual(get_free_name(filename, taken),
+                         os.path.join(self.path, 'PNG', '640x480_b_3.png'))
+        self.assertEqual(get_free_name(self.file('new.png'), taken),
+                         self.file('new.png'))
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+
+class MoveJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+        self.journal_filename = os.path.join(self.path, 'journal')
+        for folder in 'JPEG', 'DUPLICATES':
+            os.mkdir(os.path.join(self.path, folder))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_recover(self):
+        # A complete batch, then one that was interrupted after moving c
+        # (but not d), and a line cut short.
+        records = [
+            self.plan('a', 'JPEG/a', 'd1'),
+            self.plan('b', 'DUPLICATES/b', 'd1', duplicate_of='a'),
+            self.plan('x', 'JPEG/x', 'd2'),  # vanished
+            {'op': 'done', 'source': self.file('a')},
+            {'op': 'done', 'source': self.file('b')},
+            self.plan('c', 'JPEG/c', 'd3'),
+            self.plan('d', 'JPEG/d', 'd4'),
+        ]
+        with open(self.journal_filename, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.write('{"op": "do')
+        for name in 'JPEG/a', 'DUPLICATES/b', 'JPEG/c', 'd':
+            open(self.file(name), 'w').close()
+
+        journal = MoveJournal(self.journal_filename)
+        originals = journal.recover(dedupe=True)
+        journal.close()
+        self.assertEqual(originals, {'d1': self.file('a'),
+                                     'd3': self.file('c')})
+
+        with open(self.journal_filename) as f:
+            last_record = json.loads(f.read().rsplit('\n', 2)[-2])
+        self.assertEqual(last_record, {'op': 'done',
+                                       'source': self.file('c')})
+
+        journal = MoveJournal(self.journal_filename)
+        self.assertEqual(journal.recover(), {})
+        journal.close()
+
+    def plan(self, source, destination, digest, **kwargs):
+        return dict(op='plan', source=self.file(source),
+                    destination=self.file(destination), type='JPEG',
+                    md5=digest, **kwargs)
+
+    def file(self, name):
+        return os.path.join(self.path, *name.split('/'))
+
+
+class InspectFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.filenames = []
+        for i in range(250):
+            filename = os.path.join(self.tmp.name, 'f{:03d}'.format(i))
+            with open(filename, 'wb') as f:
+                f.write(PNG_HEADER if i % 3 else b'text')
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_multiple_jobs(self):
+        serial = list(inspect_files(self.filenames, 1))
+        concurrent = list(inspect_files(self.filenames, 3))
+        self.assertEqual(concurrent, serial)
+        self.assertEqual(
+            [file_info.filename for file_info in concurrent], self.filenames)
+        self.assertEqual(
+            sum(file_info.type == 'PNG' for file_info in concurrent), 166)
+
+    def test_missing_file(self):
+        filename = os.path.join(self.tmp.name, 'missing')
+        self.assertEqual(inspect_file(filename),
+                         FileInfo(filename, None, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+from operator import attrgetter, itemgetter
+import os
+from pathlib import Path
+import shutil
+import subprocess
+from tempfile import TemporaryDirectory
+import unittest
+
+from biggestfiles import collect_biggest_files, collect_directory_sizes, \
+    collect_file_infos, collect_file_infos_concurrently, collect_highest, \
+    collect_highest_per_group, collect_tracked_file_infos, FileInfo, \
+    format_grouped_results, get_extension, get_owner, open_index, \
+    query_index, refresh_index
+
+
+class CollectHighestTest(unittest.TestCase):
+
+    def test_limit(self):
+        actual = collect_highest([3, 9, 1, 7, 5], lambda x: x, 3)
+        self.assertEqual(actual, [9, 7, 5])
+
+    def test_ties_keep_earlier_elements(self):
+        items = [('a', 1), ('b', 2), ('c', 2), ('d', 2)]
+        actual = collect_highest(items, itemgetter(1), 2)
+        self.assertEqual(actual, [('b', 2), ('c', 2)])
+
+    def test_fewer_elements_than_limit(self):
+        actual = collect_highest([2, 1], lambda x: x, 10)
+        self.assertEqual(actual, [2, 1])
+
+
+class CollectHighestPerGroupTest(unittest.TestCase):
+
+    def test_multiple_groupings(self):
+        file_infos = [
+            FileInfo(Path('a.txt'), 10),
+            FileInfo(Path('b.TXT'), 30),
+            FileInfo(Path('c.log'), 20),
+            FileInfo(Path('d.txt'), 20),
+            FileInfo(Path('e'), 5),
+        ]
+        group_keys = {
+            'extension': get_extension,
+            'size': lambda file_info: file_info.size >= 20,
+        }
+
+        actual = collect_highest_per_group(
+            file_infos, attrgetter('size'), group_keys, 2)
+
+        self.assertEqual(actual['extension'], {
+            '.txt': [file_infos[1], file_infos[3]],
+            '.log': [file_infos[2]],
+            '(none)': [file_infos[4]],
+        })
+        self.assertEqual(actual['size'], {
+            True: [file_infos[1], file_infos[2]],
+            False: [file_infos[0], file_infos[4]],
+        })
+
+    def test_format(self):
+        groupings = {'extension': {
+            '.txt': [FileInfo(Path('a.txt'), 100), FileInfo(Path('b.txt'), 5)],
+        }}
+
+        actual = list(format_grouped_results(groupings))
+
+        self.assertEqual(actual, [
+            'extension: .txt',
+            ' 100  a.txt',
+            '   5  b.txt',
+        ])
+
+    def test_format_without_results(self):
+        actual = list(format_grouped_results({'extension': {}}))
+        self.assertEqual(actual, ['No files were found.'])
+
+
+class CollectFileInfosTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+        for i in range(20):
+            directory = os.path.join(self.path, *(['d{:d}'.format(i)] * 3))
+            os.makedirs(directory)
+            for name in 'a.txt', 'b.log':
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(b'x' * (i % 7))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pattern(self):
+        file_infos = list(collect_file_infos(self.path, '*.txt'))
+        self.assertEqual(len(file_infos), 20)
+        self.assertTrue(all(fi.path.suffix == '.txt' for fi in file_infos))
+
+    def test_concurrent_results_match_serial_ones(self):
+        serial = collect_biggest_files(
+            collect_file_infos(self.path, '*'), 15)
+        concurrent = collect_biggest_files(
+            collect_file_infos_concurrently(self.path, '*', 4), 15)
+        self.assertEqual(concurrent, serial)
+
+    @unittest.skipUnless(shutil.which('git'), 'Git is not installed')
+    def test_tracked_files(self):
+        subprocess.run(['git', '-C', self.path, 'init'], check=True,
+                       stdout=subprocess.DEVNULL)
+        subprocess.run(['git', '-C', self.path, 'add', 'd5', 'd6'],
+                       check=True)
+        # Deleted files are listed until they are removed from the index.
+        os.remove(os.path.join(self.path, 'd6', 'd6', 'd6', 'a.txt'))
+
+        file_infos = collect_tracked_file_infos(self.path, '*.txt')
+
+        file_infos = sorted(file_infos)
+        self.assertEqual(file_infos, [
+            FileInfo(Path(self.path, 'd5', 'd5', 'd5', 'a.txt'), 5),
+            FileInfo(Path(self.path, 'd6', 'd6', 'd6', 'a.txt'), 6),
+        ])
+        self.assertEqual(get_owner(file_infos[1]), '(unknown)')
+
+    def test_directory_sizes(self):
+        big = os.path.join(self.path, 'd19', 'big.bin')
+        with open(big, 'wb') as f:
+            f.write(b'x' * 100000)
+        os.link(big, os.path.join(self.path, 'd18', 'link.bin'))
+
+        sizes = {fi.path.name: fi.size
+                 for fi in collect_directory_sizes(self.path, '*.bin', 1)}
+
+        self.assertEqual(len(sizes), 20)
+        self.assertGreaterEqual(sizes['d19'] + sizes['d18'], 100000)
+        self.assertEqual(min(sizes['d19'], sizes['d18']), 0)
+        self.assertEqual(sizes['d0'], 0)
+
+
+class IndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'tree')
+        self.connection = open_index(
+            os.path.join(self.tmp.name, 'index.db'), self.path)
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+
+    def test_refresh(self):
+        self.create_file('a/one.txt', 1)
+        self.create_file('a/b/two.txt', 2)
+        self.create_file('c/three.log', 3)
+        self.assertIndexedFiles('*', ['c/three.log', 'a/b/two.txt',
+                                      'a/one.txt'])
+
+        self.create_file('a/b/four.txt', 4)
+        os.remove(os.path.join(self.path, 'c', 'three.log'))
+        os.rmdir(os.path.join(self.path, 'c'))
+        self.assertIndexedFiles('*', ['a/b/four.txt', 'a/b/two.txt',
+                                      'a/one.txt'])
+        self.assertIndexedFiles('t*', ['a/b/two.txt'])
+
+    def create_file(self, relative_path, size):
+        path = os.path.join(self.path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+
+    def assertIndexedFiles(self, pattern, expected):
+        refresh_index(self.connection, self.path)
+        file_infos = query_index(self.connection, self.path, pattern)
+        actual = [fi.path.relative_to(self.path).as_posix()
+                  for fi in file_infos]
+        self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
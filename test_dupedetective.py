@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+import dupedetective
+from dupedetective import find_duplicates, get_filenames, HashCache, \
+    link_duplicates, PARTIAL_SIZE
+
+
+class FindDuplicatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_small_files(self):
+        self.create_file('a', b'foo')
+        self.create_file('b', b'bar')
+        self.create_file('c', b'foo')
+        self.create_file('d', b'fooo')
+
+        self.assertDuplicates([(3, b'foo', {'a', 'c'})])
+
+    def test_big_files_differing_in_the_middle_only(self):
+        data = b'x' * (3 * PARTIAL_SIZE)
+        changed = data[:PARTIAL_SIZE] + b'y' + data[PARTIAL_SIZE + 1:]
+        self.create_file('a', data)
+        self.create_file('b', changed)
+        self.create_file('c', data)
+        self.create_file('d', changed)
+        self.create_file('e', data[:-1] + b'z')
+
+        self.assertDuplicates([
+            (len(data), data, {'a', 'c'}),
+            (len(data), changed, {'b', 'd'}),
+        ])
+
+    def test_many_big_files(self):
+        data = os.urandom(2 * PARTIAL_SIZE + 1)
+        names = {'f{:02d}'.format(i) for i in range(20)}
+        for name in names:
+            self.create_file(name, data)
+
+        self.assertDuplicates([(len(data), data, names)])
+
+    def test_limited_records(self):
+        for i in range(10):
+            self.create_file('a{:d}'.format(i), b'x' * i)
+            self.create_file('b{:d}'.format(i), b'x' * i)
+        self.create_file('c', b'y' * 5)
+
+        self.assertDuplicates([
+            (i, b'x' * i, {'a{:d}'.format(i), 'b{:d}'.format(i)})
+            for i in range(10)], max_records=3)
+
+    @mock.patch.object(dupedetective, 'MAX_MERGE_RUNS', 3)
+    def test_limited_runs(self):
+        for i in range(20):
+            self.create_file('a{:02d}'.format(i), b'x' * (i % 7))
+        open_runs = []
+        peak = []
+
+        def _temporary_file(temporary_file=dupedetective.tempfile
+                            .TemporaryFile):
+            run = temporary_file()
+            open_runs.append(run)
+            peak.append(sum(not f.closed for f in open_runs))
+            return run
+
+        with mock.patch.object(dupedetective.tempfile, 'TemporaryFile',
+                               _temporary_file):
+            self.assertDuplicates([
+                (i, b'x' * i, {'a{:02d}'.format(j)
+                               for j in range(i, 20, 7)})
+                for i in range(7)], max_records=1)
+        self.assertGreater(len(open_runs), 20)
+        self.assertLessEqual(max(peak), 7)
+
+    def test_hash_function(self):
+        data = b'x' * (3 * PARTIAL_SIZE)
+        self.create_file('a', data)
+        self.create_file('b', data)
+
+        self.assertDuplicates([(len(data), data, {'a', 'b'})],
+                              hash_name='blake2b')
+
+    def test_multiple_jobs(self):
+        for i in range(10):
+            data = bytes([i]) * (i * PARTIAL_SIZE)
+            self.create_file('a{:d}'.format(i), data)
+            self.create_file('b{:d}'.format(i), data)
+
+        self.assertDuplicates([
+            (i * PARTIAL_SIZE, bytes([i]) * (i * PARTIAL_SIZE),
+             {'a{:d}'.format(i), 'b{:d}'.format(i)})
+            for i in range(10)], jobs=3)
+
+    def test_cache(self):
+        small = b'x' * PARTIAL_SIZE
+        big = b'x' * (3 * PARTIAL_SIZE)
+        for name in 'a', 'b':
+            self.create_file(name + '_small', small)
+            self.create_file(name + '_big', big)
+        expected = [
+            (len(small), small, {'a_small', 'b_small'}),
+            (len(big), big, {'a_big', 'b_big'}),
+        ]
+        cache_filename = os.path.join(self.tmp.name, 'cache.db')
+
+        cache = HashCache(cache_filename, 100)
+        self.assertDuplicates(expected, cache=cache, mask='?_*')
+        cache.close()
+
+        cache = HashCache(cache_filename, 100)
+        with mock.patch.object(dupedetective, 'open', create=True,
+                               side_effect=AssertionError('file read')):
+            self.assertDuplicates(expected, cache=cache, mask='?_*')
+        cache.close()
+
+    def test_hard_links(self):
+        self.create_file('a', b'foo')
+        os.link(self.path('a'), self.path('b'))
+        self.create_file('c', b'bar')
+        os.link(self.path('c'), self.path('d'))
+        self.create_file('e', b'bar')
+
+        duplicates = list(find_duplicates(get_filenames(self.tmp.name, '*')))
+
+        self.assertEqual(len(duplicates), 1)
+        size, hash, filenames, inodes = duplicates[0]
+        self.assertEqual(len(filenames), 2)
+        self.assertEqual(filenames.pop(self.path('e')), [])
+        (name, other_names), = filenames.items()
+        self.assertEqual({name} | set(other_names),
+                         {self.path('c'), self.path('d')})
+
+    def test_symbolic_links(self):
+        self.create_file('a', b'foo')
+        self.create_file('b', b'foo')
+        os.symlink(self.path('a'), self.path('0'))
+
+        duplicates = list(find_duplicates(get_filenames(self.tmp.name, '*')))
+
+        self.assertEqual([filenames for _, _, filenames, _ in duplicates],
+                         [{self.path('a'): [], self.path('b'): []}])
+
+    def test_link_duplicates(self):
+        for name in 'a', 'b', 'c':
+            self.create_file(name, b'foo')
+
+        duplicates = find_duplicates(get_filenames(self.tmp.name, '*'))
+        for size, hash, filenames, inodes in duplicates:
+            results = list(link_duplicates(filenames, 'hard'))
+            self.assertEqual(results, [(self.path('b'), None),
+                                       (self.path('c'), None)])
+
+        inodes = {os.stat(self.path(name)).st_ino for name in 'abc'}
+        self.assertEqual(len(inodes), 1)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['a', 'b', 'c'])
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def create_file(self, name, data):
+        with open(os.path.join(self.tmp.name, name), 'wb') as f:
+            f.write(data)
+
+    def assertDuplicates(self, expected, hash_name='md5', jobs=1,
+                         cache=None, mask='*', max_records=None):
+        filenames = get_filenames(self.tmp.name, mask)
+        duplicates = find_duplicates(filenames, hash_name, jobs, cache,
+                                     max_records)
+        actual = [
+            (size, hash, {os.path.basename(fn) for fn in fnames})
+            for size, hash, fnames, inodes in duplicates]
+        expected = [
+            (size, hashlib.new(hash_name, data).hexdigest(), names)
+            for size, data, names in expected]
+        self.assertEqual(sorted(actual), sorted(expected))
+
+
+class OutputFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        for name, data in [('a', b'foo'), ('b', b'foo'), ('c', b'bar'),
+                           ('d\nx', b'bar'), ('e', b'baz')]:
+            with open(os.path.join(self.tmp.name, name), 'wb') as f:
+                f.write(data)
+        os.link(os.path.join(self.tmp.name, 'a'),
+                os.path.join(self.tmp.name, 'f'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jsonl(self):
+        records = [json.loads(line)
+                   for line in self.run_script('jsonl').splitlines()]
+        records.sort(key=lambda record: record['digest'])
+
+        self.assertEqual([record['digest'] for record in records], [
+            hashlib.md5(b'bar').hexdigest(), hashlib.md5(b'foo').hexdigest()])
+        self.assertEqual(
+            [os.path.basename(f['path']) for f in records[0]['files']],
+            ['c', 'd\nx'])
+        for f in records[1]['files']:
+            stat = os.stat(f['path'])
+            self.assertEqual((f['device'], f['inode']),
+                             (stat.st_dev, stat.st_ino))
+        self.assertEqual(
+            sorted(os.path.basename(name) for f in records[1]['files']
+                   for name in [f['path']] + f['links']),
+            ['a', 'b', 'f'])
+        self.assertEqual(records[0]['linked'], [])
+
+    def test_null(self):
+        output = self.run_script('null')
+        self.assertTrue(output.endswith('\0\0'))
+        groups = [
+            sorted(os.path.basename(name) for name in group.split('\0'))
+            for group in output[:-2].split('\0\0')]
+        self.assertEqual(sorted(groups), [['a', 'b', 'f'], ['c', 'd\nx']])
+
+    def run_script(self, output_format):
+        return subprocess.run(
+            [sys.executable, dupedetective.__file__, self.tmp.name,
+             '--format', output_format],
+            check=True, stdout=subprocess.PIPE, universal_newlines=True,
+            ).stdout
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+from tempfile import TemporaryDirectory
+import unittest
+
+import find_signatures
+from find_signatures import detect_signatures, find_signatures as find, \
+    inspect_file, matches, SAMPLE_SIZE
+
+
+class DetectSignaturesTest(unittest.TestCase):
+
+    def test_boms(self):
+        for name, data in [
+                ('UTF-32-LE', '\ufeffab'.encode('utf-32-le')),
+                ('UTF-32-BE', '\ufeffab'.encode('utf-32-be')),
+                ('UTF-16-LE', '\ufeffab'.encode('utf-16-le')),
+                ('UTF-16-BE', '\ufeffab'.encode('utf-16-be')),
+                ('UTF-8', '\ufeffab'.encode('utf-8')),
+                ('GB-18030', b'\x84\x31\x95\x33ab')]:
+            self.assertEqual(detect_signatures(data).bom, name)
+        self.assertIsNone(detect_signatures(b'ab').bom)
+
+    def test_line_endings(self):
+        for expected, data in [
+                ('CRLF', b'a\r\nb\r\n'),
+                ('LF', b'a\nb\n'),
+                ('CR', b'a\rb\r'),
+                ('mixed', b'a\r\nb\n'),
+                (None, b'ab')]:
+            self.assertEqual(detect_signatures(data).line_endings, expected)
+
+    def test_wide_encodings(self):
+        data = '\ufeff#!/bin/sh\r\necho\r\n'.encode('utf-16-le')
+        signatures = detect_signatures(data)
+        self.assertEqual(signatures.line_endings, 'CRLF')
+        self.assertFalse(signatures.binary)
+        self.assertEqual(signatures.shebang, '/bin/sh')
+
+    def test_carriage_return_at_end_of_sample(self):
+        data = b'a\r\n' * (SAMPLE_SIZE // 3) + b'a' * (SAMPLE_SIZE % 3 - 1)
+        data += b'\r'
+        self.assertEqual(len(data), SAMPLE_SIZE)
+        self.assertEqual(detect_signatures(data).line_endings, 'CRLF')
+
+    def test_binary(self):
+        signatures = detect_signatures(b'\x7fELF\x02\x01\x01\0\0\n')
+        self.assertTrue(signatures.binary)
+        self.assertIsNone(signatures.line_endings)
+
+    def test_shebang(self):
+        signatures = detect_signatures(b'#! /usr/bin/env python\nx\n')
+        self.assertEqual(signatures.shebang, '/usr/bin/env python')
+        self.assertTrue(matches(signatures, ['bom', 'shebang']))
+        self.assertFalse(matches(signatures, ['bom', 'crlf']))
+        self.assertTrue(matches(signatures, ['lf']))
+
+
+class FindSignaturesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+        for i in range(60):
+            directory = os.path.join(self.path, 'd{:d}'.format(i % 5),
+                                     's{:d}'.format(i % 3))
+            self.create_file(os.path.join(directory, '{:d}.txt'.format(i)),
+                             b'\xef\xbb\xbfa\n' if i % 4 else b'a\n')
+        self.create_file(os.path.join(self.path, '.git', 'HEAD'),
+                         b'\xef\xbb\xbfa\n')
+        os.symlink(os.path.join(self.path, 'd0'),
+                   os.path.join(self.path, 'link'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_multiple_jobs(self):
+        serial = list(find(self.path, skip_vcs=True))
+        concurrent = sorted(find(self.path, jobs=4, skip_vcs=True))
+        self.assertEqual(len(serial), 60)
+        self.assertEqual(sorted(serial), concurrent)
+        self.assertEqual(len(list(find(self.path, jobs=4))), 61)
+
+    def test_fix(self):
+        filename = os.path.join(self.path, 'script')
+        data = b'#!/bin/sh\n' + b'x' * (find_signatures.BLOCK_SIZE * 2)
+        self.create_file(filename, b'\xef\xbb\xbf' + data)
+        os.chmod(filename, 0o755)
+
+        self.assertEqual(inspect_file(filename, fix=True).bom, 'UTF-8')
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(stat.S_IMODE(os.stat(filename).st_mode), 0o755)
+        self.assertFalse([name for name in os.listdir(self.path)
+                          if name.startswith('.find_signatures-')])
+        self.assertIsNone(inspect_file(filename, fix=True).bom)
+
+    def test_other_boms_are_not_fixed(self):
+        filename = os.path.join(self.path, 'utf16.txt')
+        data = '\ufeffa\n'.encode('utf-16-le')
+        self.create_file(filename, data)
+        inspect_file(filename, fix=True)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def create_file(self, filename, data):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
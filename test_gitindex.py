@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+from tempfile import TemporaryDirectory
+import unittest
+
+from gitindex import find_repository, GitIndexError, list_tracked_files
+
+
+def git(path, *args):
+    subprocess.run(['git', '-C', path] + list(args), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@unittest.skipUnless(shutil.which('git'), 'Git is not installed')
+class ListTrackedFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+        git(self.path, 'init')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_versions(self):
+        self.create_file('a.txt', 1)
+        self.create_file('src/b.txt', 2)
+        self.create_file('src/sub/' + 'c' * 100 + '.txt', 3)
+        self.create_file('untracked.txt', 4)
+        os.symlink('a.txt', os.path.join(self.path, 'link.txt'))
+        git(self.path, 'add', 'a.txt', 'src', 'link.txt')
+
+        expected = [
+            ('a.txt', 1),
+            ('src/b.txt', 2),
+            ('src/sub/' + 'c' * 100 + '.txt', 3),
+        ]
+        for version in ('2', '3', '4'):
+            git(self.path, 'update-index', '--index-version', version)
+            self.assertTrackedFiles(self.path, expected)
+
+    def test_subdirectory(self):
+        self.create_file('a.txt', 1)
+        self.create_file('src/b.txt', 2)
+        self.create_file('srcfile.txt', 3)
+        git(self.path, 'add', '.')
+
+        self.assertTrackedFiles(os.path.join(self.path, 'src'),
+                                [('b.txt', 2)])
+
+    def test_empty_repository(self):
+        self.assertTrackedFiles(self.path, [])
+
+    def test_not_in_repository(self):
+        with TemporaryDirectory() as path:
+            with self.assertRaises(ValueError):
+                find_repository(path)
+            with self.assertRaises(GitIndexError):
+                list(list_tracked_files(path))
+
+    def test_truncated_index(self):
+        self.create_file('a.txt', 1)
+        self.create_file('b.txt', 2)
+        git(self.path, 'add', '.')
+        index = os.path.join(self.path, '.git', 'index')
+        with open(index, 'r+b') as f:
+            f.truncate(100)
+
+        with self.assertRaises(GitIndexError):
+            list(list_tracked_files(self.path))
+
+    def test_split_index(self):
+        self.create_file('a.txt', 1)
+        git(self.path, 'add', '.')
+        git(self.path, 'update-index', '--split-index')
+
+        with self.assertRaises(GitIndexError):
+            list(list_tracked_files(self.path))
+
+    def create_file(self, relative_path, size):
+        path = os.path.join(self.path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+
+    def assertTrackedFiles(self, path, expected):
+        actual = [(os.path.relpath(file_path, path), entry.size)
+                  for file_path, entry in list_tracked_files(path)]
+        self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import subprocess
+from tempfile import TemporaryDirectory
+import unittest
+from unittest import mock
+
+import linecounter
+from linecounter import classify_lines, compile_patterns, count_lines, \
+    get_language, LineCountCache, LineCounts, process_files
+
+
+class CountLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_empty_file(self):
+        self.assertLineCount(b'', 0)
+
+    def test_trailing_line_break(self):
+        self.assertLineCount(b'foo\nbar\n', 2)
+
+    def test_no_trailing_line_break(self):
+        self.assertLineCount(b'foo\nbar', 2)
+
+    def test_empty_lines(self):
+        self.assertLineCount(b'\n\n\n', 3)
+
+    def test_line_break_at_block_boundary(self):
+        self.assertLineCount(b'abc\n' * 5, 5, block_size=4)
+        self.assertLineCount(b'abc\n' * 5 + b'x', 6, block_size=4)
+
+    def assertLineCount(self, data, expected, **kwargs):
+        filename = os.path.join(self.tmp.name, 'file')
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+        with open(filename, 'rb') as f:
+            self.assertEqual(sum(1 for line in f), expected)
+        self.assertEqual(count_lines(filename, **kwargs), expected)
+
+
+class ClassifyLinesTest(unittest.TestCase):
+
+    C_SOURCE = (
+        b'/* A block comment\n'
+        b'\n'
+        b'   spanning lines */\n'
+        b'#include <stdio.h>\n'
+        b'\n'
+        b'int main() {  // a line comment\n'
+        b'    // only a comment\n'
+        b'    puts("/* not a comment */");\n'
+        b'    putchar(\'\\\'\'); /* trailing */\n'
+        b'    /* leading */ return 0;\n'
+        b'}')
+
+    PYTHON_SOURCE = (
+        b'#!/usr/bin/env python\n'
+        b'def f():\n'
+        b'    """Docstring\n'
+        b'\n'
+        b'    # not a comment\n'
+        b'    """\n'
+        b'    return "\\" # "  # comment\n'
+        b'\n'
+        b'  \t\n')
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_c(self):
+        self.assertLineCounts('main.c', self.C_SOURCE, LineCounts(6, 3, 2))
+
+    def test_python(self):
+        self.assertLineCounts('main.py', self.PYTHON_SOURCE,
+                              LineCounts(5, 1, 3))
+
+    def test_php(self):
+        self.assertLineCounts(
+            'index.php',
+            b'<?php\n'
+            b'// a comment\n'
+            b'# another comment\n'
+            b'echo "# not a comment"; // trailing\n'
+            b'/* a block */\n',
+            LineCounts(2, 3, 0))
+
+    def test_ini(self):
+        self.assertLineCounts(
+            'setup.cfg',
+            b'; a comment\n'
+            b'[section]\n'
+            b'# another comment\n'
+            b'\n'
+            b'key = value\n',
+            LineCounts(2, 2, 1))
+
+    def test_unknown_language(self):
+        self.assertLineCounts('README', b'# Title\n\ntext',
+                              LineCounts(2, 0, 1))
+
+    def test_block_boundaries(self):
+        for block_size in range(1, 8):
+            self.assertLineCounts('main.c', self.C_SOURCE,
+                                  LineCounts(6, 3, 2), block_size=block_size)
+            self.assertLineCounts('main.py', self.PYTHON_SOURCE,
+                                  LineCounts(5, 1, 3), block_size=block_size)
+
+    def assertLineCounts(self, name, data, expected, **kwargs):
+        filename = os.path.join(self.tmp.name, name)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+        counts = classify_lines(filename, get_language(filename), **kwargs)
+        self.assertEqual(counts, expected)
+        self.assertEqual(counts.total, count_lines(filename))
+
+
+class ProcessFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_patterns(self):
+        match = compile_patterns(['*.py', 'setup.*', '.*'])
+        self.assertEqual(match('setup.py'), ['*.py', 'setup.*'])
+        self.assertEqual(match('.hidden.py'), ['.*'])
+        self.assertEqual(match('README'), [])
+
+    def test_overlapping_patterns(self):
+        self.create_file('a.py', 2)
+        self.create_file('sub/b.py', 3)
+        self.create_file('sub/c.txt', 5)
+        self.create_file('sub/.d.py', 7)
+
+        self.assertStats(['*.py', '*.*', '.*'],
+                         {'*.py': 5, '*.*': 10, '.*': 7},
+                         ['a.py', 'sub/.d.py', 'sub/b.py', 'sub/c.txt'])
+
+    @mock.patch.object(linecounter, 'BATCH_FILES', 2)
+    @mock.patch.object(linecounter, 'BATCH_SIZE', 16)
+    def test_multiple_jobs(self):
+        for i in range(10):
+            self.create_file('f{:d}.txt'.format(i), i)
+        self.create_file('big.txt', 0, b'line\n' * 9 + b'last')
+        self.create_file('big2.txt', 0, b'line\n' * 8)
+
+        filenames = []
+        serial = process_files(
+            self.path, ['*.txt', 'f*'],
+            lambda filename, line_count: filenames.append(
+                (filename, line_count)))
+        self.assertEqual(serial, {'*.txt': 63, 'f*': 45})
+
+        concurrent_filenames = []
+        concurrent = process_files(
+            self.path, ['*.txt', 'f*'],
+            lambda filename, line_count: concurrent_filenames.append(
+                (filename, line_count)),
+            jobs=3)
+        self.assertEqual(concurrent, serial)
+        self.assertEqual(concurrent_filenames, filenames)
+
+    def test_cache(self):
+        self.create_file('a.txt', 1)
+        self.create_file('b.txt', 2)
+        self.create_file('c.txt', 3)
+        cache_filename = os.path.join(self.path, 'cache.db')
+
+        def count(expected, expected_filenames):
+            cache = LineCountCache(cache_filename)
+            self.assertStats(['*.txt'], {'*.txt': expected},
+                             expected_filenames, cache=cache)
+            cache.close()
+
+        count(6, ['a.txt', 'b.txt', 'c.txt'])
+
+        self.create_file('b.txt', 4)
+        os.remove(os.path.join(self.path, 'c.txt'))
+        with mock.patch.object(linecounter, 'count_lines',
+                               return_value=4) as count_lines:
+            count(5, ['a.txt', 'b.txt'])
+        count_lines.assert_called_once_with(os.path.join(self.path, 'b.txt'))
+
+        cache = LineCountCache(cache_filename)
+        self.assertEqual(cache.connection.execute(
+            'SELECT COUNT(*) FROM line_counts').fetchone(), (2,))
+        cache.close()
+
+    def test_cache_keeps_classified_counts(self):
+        self.create_file('a.py', 0, b'# comment\nx = 1\n')
+        self.create_file('b.py', 0, b'y = 2\n')
+        cache_filename = os.path.join(self.path, 'cache.db')
+
+        def count(classify, jobs=1):
+            cache = LineCountCache(cache_filename)
+            self.assertStats(['*.py'], expected[classify], ['a.py', 'b.py'],
+                             cache=cache, classify=classify, jobs=jobs)
+            cache.close()
+
+        expected = {True: {'Python': LineCounts(2, 1, 0)}, False: {'*.py': 3}}
+        count(classify=True)
+        count(classify=False, jobs=3)
+        self.create_file('b.py', 0, b'y = 2\n\n')
+        expected = {True: {'Python': LineCounts(2, 1, 1)}, False: {'*.py': 4}}
+        count(classify=False)
+
+        # Only the changed file is classified again.
+        count_file = linecounter.count_file
+        with mock.patch.object(linecounter, 'count_file',
+                               side_effect=count_file) as count_file_mock:
+            count(classify=True)
+        count_file_mock.assert_called_once_with(
+            os.path.join(self.path, 'b.py'), True)
+
+    def test_classify(self):
+        self.create_file('a.py', 0, b'# comment\nx = 1\n\n')
+        self.create_file('b.py', 2)
+        self.create_file('c.sh', 0, b'#!/bin/sh\necho "#"\n')
+        self.create_file('README', 3)
+
+        for jobs in (1, 3):
+            self.assertStats(['*'], {
+                'Python': LineCounts(3, 1, 1),
+                'Shell': LineCounts(1, 1, 0),
+                'other': LineCounts(3, 0, 0),
+            }, ['README', 'a.py', 'b.py', 'c.sh'], classify=True, jobs=jobs)
+
+    def test_ignored_files(self):
+        self.create_file('.git/config', 1)
+        self.create_file('.gitignore', 1, b'build/\n*.log\n!keep.log\n')
+        self.create_file('a.log', 2)
+        self.create_file('keep.log', 3)
+        self.create_file('build/b.log', 4)
+        self.create_file('src/.gitignore', 1, b'/generated.*\n')
+        self.create_file('src/generated.txt', 5)
+        self.create_file('src/sub/generated.txt', 6)
+        self.create_file('src/build', 7)
+
+        self.assertStats(['*'], {'*': 16},
+                         ['keep.log', 'src/build', 'src/sub/generated.txt'],
+                         use_gitignore=True)
+
+    @unittest.skipUnless(shutil.which('git'), 'Git is not installed')
+    def test_tracked_files(self):
+        self.create_file('a.txt', 1)
+        self.create_file('src/b.txt', 2)
+        self.create_file('src/deleted.txt', 3)
+        self.create_file('untracked.txt', 4)
+        subprocess.run(['git', '-C', self.path, 'init'], check=True,
+                       stdout=subprocess.DEVNULL)
+        subprocess.run(['git', '-C', self.path, 'add', 'a.txt', 'src'],
+                       check=True)
+        os.remove(os.path.join(self.path, 'src/deleted.txt'))
+
+        self.assertStats(['*.txt'], {'*.txt': 3}, ['a.txt', 'src/b.txt'],
+                         tracked=True)
+
+    def create_file(self, relative_path, line_count, data=None):
+        path = os.path.join(self.path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data if data is not None else b'x\n' * line_count)
+
+    def assertStats(self, patterns, expected, expected_filenames, **kwargs):
+        filenames = []
+
+        def callback(filename, line_count):
+            filenames.append(os.path.relpath(filename, self.path))
+
+        stats = process_files(self.path, patterns, callback, **kwargs)
+
+        self.assertEqual(stats, expected)
+        self.assertEqual(sorted(filenames), expected_filenames)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import os
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+import reposort
+from reposort import find_id, Id, IdIndex, read_prefix, scan_files
+
+
+class FindIdTest(unittest.TestCase):
+
+    def test_svn_id(self):
+        id_ = find_id(
+            b'#!/usr/bin/env python\n'
+            b'# $Id: foo bar.py 123 2006-05-12 10:11:12Z some one $\n',
+            'svn', 10, 'foo bar.py')
+        self.assertId(id_, 'foo bar.py', '123', '2006-05-12', '10:11:12',
+                      'some one')
+
+    def test_rcs_id(self):
+        id_ = find_id(
+            b'/* $Id: foo.c,v 1.12 2006/05/12 10:11:12 someone Exp $ */\n',
+            'rcs', 10, 'foo.c')
+        self.assertId(id_, 'foo.c', '1.12', '2006/05/12', '10:11:12',
+                      'someone')
+
+    def test_other_type_is_not_parsed(self):
+        data = b'/* $Id: foo.c,v 1.12 2006/05/12 10:11:12 someone Exp $ */\n'
+        self.assertIsNone(find_id(data, 'svn', 10, 'foo.c'))
+
+    def test_separate_keywords(self):
+        id_ = find_id(
+            b'# $Author: someone $\n'
+            b'# $Date: 2006-05-12 01:11:12 +0200 (Fri, 12 May 2006) $\n'
+            b'# $Rev: 123 $\n',
+            'svn', 10, os.path.join('some', 'foo.py'))
+        self.assertId(id_, 'foo.py', '123', '2006-05-11', '23:11:12',
+                      'someone')
+
+    def test_keywords_without_date(self):
+        self.assertIsNone(find_id(b'# $Revision: 1.2 $\n', 'rcs', 10, 'x'))
+
+    def test_max_lines(self):
+        data = b'\n' * 3 + b'$Id: foo.py 1 2006-05-12 10:11:12Z someone $\n'
+        self.assertIsNone(find_id(data, 'svn', 3, 'foo.py'))
+        self.assertIsNotNone(find_id(data, 'svn', 4, 'foo.py'))
+
+    def test_binary_file(self):
+        with TemporaryDirectory() as path:
+            filename = os.path.join(path, 'file')
+            with open(filename, 'wb') as f:
+                f.write(b'$Id: file 1 2006-05-12 10:11:12Z someone $\0')
+            self.assertIsNone(read_prefix(filename))
+
+    def test_order(self):
+        older = Id.create('b.py', '2', '2006/05/12', '10:11:12', 'someone')
+        newer = Id.create('a.py', '1', '2006-05-12', '10:11:13', 'someone')
+        self.assertEqual(newer.timestamp - older.timestamp, 1)
+        self.assertLess(older, newer)
+
+    def assertId(self, id_, filename, version, date, time, author):
+        self.assertEqual(
+            (id_.filename, id_.version, id_.date, id_.time, id_.author),
+            (filename, version, date, time, author))
+
+
+class ScanFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = self.tmp.name
+        for i in range(250):
+            directory = os.path.join(self.path, 'd{:d}'.format(i % 7))
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, '{:d}.py'.format(i)), 'w') as f:
+                f.write('# $Id: {:d}.py {:d} 2006-05-{:02d} 10:11:12Z x $\n'
+                        .format(i, i, i % 28 + 1))
+        os.makedirs(os.path.join(self.path, '.svn'))
+        with open(os.path.join(self.path, '.svn', 'entries'), 'w') as f:
+            f.write('# $Id: entries 1 2006-05-01 10:11:12Z x $\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_multiple_jobs(self):
+        serial = sorted(self.scan(jobs=1))
+        concurrent = sorted(self.scan(jobs=3))
+        self.assertEqual(len(serial), 250)
+        self.assertEqual(concurrent, serial)
+
+    def scan(self, jobs):
+        opts = SimpleNamespace(type='svn', num_lines=10, jobs=jobs)
+        return scan_files(self.path, opts)
+
+
+class IdIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'repo')
+        self.index_filename = os.path.join(self.tmp.name, 'index.db')
+        self.opts = SimpleNamespace(type='svn', num_lines=10, jobs=1)
+        self.create_file('a.py', 1)
+        self.create_file('sub/b.py', 2)
+        self.create_file('sub/c.txt', None)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_update(self):
+        self.assertIndexed(['a.py', 'b.py'],
+                           ['a.py', 'sub/b.py', 'sub/c.txt'])
+        self.assertIndexed(['a.py', 'b.py'], [])
+
+        self.create_file('a.py', 3)
+        os.utime(os.path.join(self.path, 'a.py'), ns=(1, 1))
+        os.remove(os.path.join(self.path, 'sub', 'b.py'))
+        self.assertIndexed(['a.py'], ['a.py'])
+
+    def test_update_files_and_remove_tree(self):
+        index = IdIndex(':memory:', self.path, 'svn', 10)
+        index.update(self.opts)
+
+        self.create_file('sub/d.py', 4)
+        self.assertTrue(index.update_files(
+            [os.path.join(self.path, 'sub', 'd.py')], self.opts))
+        self.assertEqual(self.query(index), ['a.py', 'b.py', 'd.py'])
+        self.assertEqual(self.query(index, top=1), ['d.py'])
+
+        self.assertTrue(index.remove_tree(os.path.join(self.path, 'sub')))
+        self.assertEqual(self.query(index), ['a.py'])
+
+    def create_file(self, relative_path, day):
+        path = os.path.join(self.path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            if day is not None:
+                f.write('# $Id: {} 1 2006-05-{:02d} 10:11:12Z x $\n'.format(
+                    os.path.basename(path), day))
+
+    def assertIndexed(self, expected, expected_scanned):
+        scanned = []
+
+        def _scan_file(filename, *args):
+            scanned.append(os.path.relpath(filename, self.path))
+            return scan_file(filename, *args)
+
+        scan_file = reposort.scan_file
+        with mock.patch.object(reposort, 'scan_file', _scan_file):
+            index = IdIndex(self.index_filename, self.path, 'svn', 10)
+            index.update(self.opts)
+            self.assertEqual(self.query(index), expected)
+            index.close()
+        self.assertEqual(sorted(scanned), expected_scanned)
+
+    def query(self, index, top=None):
+        return [id_.filename for id_ in index.query(top)]
+
+
+if __name__ == '__main__':
+    unittest.main()